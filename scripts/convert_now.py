@@ -7,10 +7,17 @@ if BASE_DIR not in sys.path:
 
 from src.download_monitoring_usulan import convert_monitoring_json_to_excel
 from src.drive_upload import upload_file_to_drive
+from src.monitoring_store import open_monitoring_store
 
 
 if __name__ == "__main__":
-    convert_monitoring_json_to_excel(
+    # Dengan MONITORING_STORE=sqlite, ekspor dulu isi SQLite ke JSON
+    store = open_monitoring_store()
+    if store is not None:
+        exported = store.export_json("data/downloads/monitoring_usulan.json")
+        store.close()
+        print(f"Diekspor {exported} item dari SQLite ke data/downloads/monitoring_usulan.json")
+    sheet = convert_monitoring_json_to_excel(
         "data/downloads/monitoring_usulan.json",
         "data/downloads/monitoring_usulan.xlsx",
         pertek_drive_folder_id="15e0vW-4SJjCjBP8ksIFc1Pw1oUZgJX1F",
@@ -23,6 +30,7 @@ if __name__ == "__main__":
             convert_spreadsheet=True,
             replace_by_title=True,
             custom_title="monitoring_usulan",
+            content_md5=sheet.content_md5(),
         )
     except Exception as e:
         print(f"Gagal upload ke Google Drive: {e}")
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from metrics import DEFERRED_TASKS
+
+
+class CycleBudget:
+    """Wall-clock budget of one ``run_once`` cycle.
+
+    Stages call ``expired()`` before starting more work and cap request
+    timeouts with ``timeout()``; the last ``reserve`` seconds are kept for the
+    steps that close the cycle (writing and uploading the monitoring sheet).
+    Work that did not fit is recorded with ``defer`` and printed by
+    ``report()``. ``seconds=None`` means no limit.
+    """
+
+    def __init__(self, seconds: float | None = None, reserve: float = 0.0):
+        self.seconds = seconds
+        self.reserve = max(0.0, reserve)
+        self._deadline = None if seconds is None else time.monotonic() + seconds
+        self._lock = threading.Lock()
+        # stage -> tasks deferred, or None when the whole stage was not started
+        self.deferred: dict[str, int | None] = {}
+
+    def remaining(self) -> float:
+        """Seconds left for deferrable work (infinite without a budget)."""
+        if self._deadline is None:
+            return float("inf")
+        return self._deadline - self.reserve - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, default: float, minimum: float = 10.0) -> float:
+        """Request timeout that does not run (much) past the budget."""
+        return max(minimum, min(default, self.remaining()))
+
+    def defer(self, stage: str, count: int | None = None) -> None:
+        """Record ``count`` tasks of ``stage`` as deferred (``None``: the whole stage)."""
+        with self._lock:
+            if count is None:
+                self.deferred[stage] = None
+                return
+            if count <= 0:
+                return
+            self.deferred[stage] = (self.deferred.get(stage) or 0) + count
+        DEFERRED_TASKS.inc(count, stage=stage)
+
+    def report(self) -> None:
+        with self._lock:
+            deferred = dict(self.deferred)
+        if not deferred:
+            return
+        detail = ", ".join(
+            f"{stage}={'seluruh tahap' if n is None else f'{n} task'}" for stage, n in deferred.items()
+        )
+        print(f"Anggaran waktu siklus ({self.seconds:.0f}s) habis; ditunda ke siklus berikutnya: {detail}")
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import time
+
+from env import env_float
+
+
+DEFAULT_NEGATIVE_CACHE_PATH = "data/state/document_negative_cache.json"
+
+# status_usulan IDs (see STATUS_USULAN_MAP) at which a signed Pertek can exist:
+# Pertek signed (22, 53) and every later step of the process.
+DEFAULT_PERTEK_STATUS_IDS = frozenset(
+    {
+        "7", "8", "9", "10", "11", "22", "23", "24", "26", "27", "28", "29", "30",
+        "31", "32", "35", "36", "37", "38", "39", "40", "41", "42", "43", "44", "45",
+        "46", "47", "48", "49", "53", "59", "60", "61", "62", "63", "64", "66", "67",
+        "68", "69", "70", "71", "72", "73", "74",
+    }
+)
+
+# status_usulan IDs at which a signed SK can exist
+DEFAULT_SK_STATUS_IDS = frozenset(
+    {"10", "11", "30", "31", "32", "45", "48", "49", "63", "64"}
+)
+
+_DEFAULTS = {"pertek": DEFAULT_PERTEK_STATUS_IDS, "sk": DEFAULT_SK_STATUS_IDS}
+_ENV_KEYS = {"pertek": "PERTEK_STATUS_IDS", "sk": "SK_STATUS_IDS"}
+
+
+def allowed_status_ids(doc_type: str) -> frozenset[str] | None:
+    """Status IDs for which ``doc_type`` ("pertek"/"sk") is fetched.
+
+    Override with env ``PERTEK_STATUS_IDS`` / ``SK_STATUS_IDS`` (comma-separated
+    IDs). ``*`` disables gating and returns ``None``.
+    """
+    raw = os.getenv(_ENV_KEYS[doc_type])
+    if raw is None or not raw.strip():
+        return _DEFAULTS[doc_type]
+    if raw.strip() in ("*", "all"):
+        return None
+    return frozenset(s.strip() for s in raw.split(",") if s.strip())
+
+
+class NegativeCache:
+    """Persistent record of documents that were not available (HTTP 404).
+
+    An entry suppresses further requests for the same document while the
+    record's ``status_usulan`` is unchanged and the entry is younger than the
+    TTL (env ``DOC_NEGATIVE_TTL_HOURS``, default 24). Thread-safe.
+    """
+
+    def __init__(self, path: str = DEFAULT_NEGATIVE_CACHE_PATH, ttl_seconds: float | None = None):
+        self.path = path
+        self.ttl_seconds = env_float("DOC_NEGATIVE_TTL_HOURS", 24) * 3600 if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._entries = data
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    @staticmethod
+    def _key(doc_type: str, item_id: str) -> str:
+        return f"{doc_type}:{item_id}"
+
+    def should_skip(self, doc_type: str, item_id: str, status: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(self._key(doc_type, item_id))
+        if not entry:
+            return False
+        if entry.get("status") != status:
+            return False
+        return (time.time() - float(entry.get("ts", 0))) < self.ttl_seconds
+
+    def record_miss(self, doc_type: str, item_id: str, status: str) -> None:
+        with self._lock:
+            self._entries[self._key(doc_type, item_id)] = {"status": status, "ts": time.time()}
+
+    def clear(self, doc_type: str, item_id: str) -> None:
+        with self._lock:
+            self._entries.pop(self._key(doc_type, item_id), None)
+
+    def save(self) -> None:
+        now = time.time()
+        with self._lock:
+            # Drop expired entries so the file does not grow forever
+            entries = {
+                k: v for k, v in self._entries.items()
+                if (now - float(v.get("ts", 0))) < self.ttl_seconds
+            }
+            self._entries = entries
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
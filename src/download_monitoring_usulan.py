@@ -1,20 +1,36 @@
+import hashlib
 import json
 import os
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
-from http.client import IncompleteRead
-from typing import Any, Dict, List
-import ijson
+import re
+from urllib.request import Request
+from urllib.error import HTTPError
+from typing import Any, Callable, Dict, List
+import queue
+import threading
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from selected_no_peserta import selected_no_peserta
+from cycle_budget import CycleBudget
+from http_session import siasn_limiter, siasn_session
+from metrics import CACHE_HITS, DOCUMENT_THROUGHPUT, PIPELINE_ACTIVE, PIPELINE_STEP
+from document_gate import NegativeCache, allowed_status_ids
+from monitoring_records import (
+    MonitoringRecord,
+    MonitoringRecordTable,
+    append_items_to_monitoring_json,
+    load_monitoring_records,
+)
+from monitoring_store import MonitoringStore
+from rate_limit import TokenBucket
+from retry_policy import REQUEST_ERRORS, RetryableError, describe_error, siasn_retry
+from sso_token import TokenProvider
+from env import env_float, env_int
 
 try:
     from openpyxl import Workbook
-    from openpyxl import load_workbook
+    from openpyxl.utils import get_column_letter
 except Exception:
     Workbook = None  # type: ignore
-    load_workbook = None  # type: ignore
 
 
 API_URL = (
@@ -131,6 +147,163 @@ def load_sso_token(path: str) -> str:
     return token
 
 
+def _authorized_request(url: str, headers: Dict[str, str], tokens: TokenProvider) -> tuple[Request, str]:
+    """GET request carrying the provider's current token; also returns that token."""
+    token = tokens.token()
+    return Request(url, headers={**headers, "Authorization": f"Bearer {token}"}, method="GET"), token
+
+
+def _read_body(req: Request, timeout: tuple[float, float]) -> bytes:
+    """One attempt for ``siasn_retry.call``; a non-200 answer raises ``HTTPError``."""
+    with siasn_session.urlopen(req, timeout=timeout) as resp:
+        status = resp.getcode()
+        body = resp.read()
+    if status != 200:
+        raise HTTPError(req.full_url, status, f"HTTP {status}", resp.headers, None)
+    return body
+
+
+def _open_authorized(url: str, headers: Dict[str, str], tokens: TokenProvider, timeout: tuple[float, float]):
+    """Open a GET with the provider's token; a 401 renews it once (shared) and repeats."""
+    req, used_token = _authorized_request(url, headers, tokens)
+    try:
+        return siasn_session.urlopen(req, timeout=timeout)
+    except HTTPError as e:
+        # Token kedaluwarsa di tengah run: perbarui sekali (bersama) lalu ulangi
+        if e.code != 401 or not tokens.refresh(used_token):
+            raise
+    req, _ = _authorized_request(url, headers, tokens)
+    return siasn_session.urlopen(req, timeout=timeout)
+
+
+class InvalidDocumentError(Exception):
+    """The server answered 200 with something that is not a PDF (e.g. an HTML error page)."""
+
+
+class DocumentWriteError(Exception):
+    """Writing the PDF to disk failed; not retried and not counted against SIASN."""
+
+
+# Documents are copied to disk in chunks of this size instead of read whole
+_DOCUMENT_CHUNK_SIZE = 64 * 1024
+# PDF readers accept the %PDF- header anywhere in the first 1024 bytes
+_PDF_HEADER_WINDOW = 1024
+
+
+def _stream_to_file(resp, target_file: str) -> int:
+    """Copy ``resp`` to ``target_file`` via ``<target>.part`` and an atomic rename.
+
+    The file only appears once the body is complete: its length must match
+    ``Content-Length`` (when sent) and ``%PDF-`` must appear within its
+    first 1024 bytes.
+    Returns the number of bytes written.
+    """
+    status = resp.getcode()
+    if status != 200:
+        raise HTTPError(resp.url, status, f"HTTP {status}", resp.headers, None)
+    expected = resp.headers.get("Content-Length")
+    tmp_path = target_file + ".part"
+    size = 0
+    head = b""
+    try:
+        try:
+            f = open(tmp_path, "wb")
+        except OSError as e:
+            raise DocumentWriteError(f"gagal menulis {tmp_path}: {e}") from e
+        with f:
+            while True:
+                chunk = resp.read(_DOCUMENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < _PDF_HEADER_WINDOW:
+                    head += chunk[: _PDF_HEADER_WINDOW - len(head)]
+                try:
+                    f.write(chunk)
+                except OSError as e:
+                    raise DocumentWriteError(f"gagal menulis {tmp_path}: {e}") from e
+                size += len(chunk)
+        if size == 0:
+            raise RetryableError("empty response")
+        if expected is not None and expected.isdigit() and size != int(expected):
+            raise RetryableError(f"body {size} byte, Content-Length {expected}")
+        if b"%PDF-" not in head:
+            raise InvalidDocumentError(f"bukan PDF (diawali {head[:16]!r})")
+        try:
+            os.replace(tmp_path, target_file)
+        except OSError as e:
+            raise DocumentWriteError(f"gagal mengganti {target_file}: {e}") from e
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def _download_document(
+    url: str,
+    headers: Dict[str, str],
+    tokens: TokenProvider,
+    target_file: str,
+    operation: str,
+    budget: CycleBudget | None = None,
+) -> tuple[bool, str, bool]:
+    """Stream one PDF to ``target_file`` through ``siasn_retry``.
+
+    Returns ``(ok, message, not_found)``: the error on failure, size and
+    throughput on success. A 404 is final and reported as ``not_found``.
+    """
+    stats: Dict[str, float] = {}
+
+    def _attempt(timeout: tuple[float, float]) -> None:
+        started = time.monotonic()
+        with _open_authorized(url, headers, tokens, timeout) as resp:
+            stats["bytes"] = _stream_to_file(resp, target_file)
+        stats["seconds"] = max(time.monotonic() - started, 1e-6)
+
+    try:
+        siasn_retry.call(_attempt, operation, budget=budget)
+    except HTTPError as e:
+        # 404: dokumen belum tersedia; tidak di-retry dan dicatat di cache 404
+        return False, describe_error(e), e.code == 404
+    except (InvalidDocumentError, DocumentWriteError) as e:
+        return False, str(e), False
+    except REQUEST_ERRORS as e:
+        return False, describe_error(e), False
+    mb_per_s = stats["bytes"] / stats["seconds"] / (1024 * 1024)
+    DOCUMENT_THROUGHPUT.observe(mb_per_s, operation=operation)
+    return True, f"{stats['bytes'] / 1024:.0f} KB, {mb_per_s:.2f} MB/s", False
+
+
+def _failure_message(e: Exception, context: str = "") -> str:
+    """Final error of a retried request, with the response body of an HTTP error."""
+    if not isinstance(e, HTTPError):
+        return f"Request failed{context}: {describe_error(e)}"
+    msg = f"Request failed{context}: {e.code} {e.reason}"
+    try:
+        detail = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
+    except Exception:
+        detail = ""
+    if detail:
+        msg += f"\n{detail}"
+    return msg
+
+
+def _print_pool_stats(label: str) -> None:
+    stats = siasn_session.stats()
+    print(
+        f"HTTP pool ({label}): koneksi dibuka={stats['opened']}, "
+        f"dipakai ulang={stats['reused']}, idle={stats['idle']}"
+    )
+    if siasn_limiter is not None:
+        lim = siasn_limiter.stats()
+        print(
+            f"Limiter SIASN ({label}): batas={lim['limit']}, latensi={lim['latency_ms']}ms "
+            f"(terbaik {lim['best_latency_ms']}ms), sukses={lim['successes']}, overload={lim['overloads']}"
+        )
+
+
 def download_monitoring_usulan(
     out_path: str, localstorage_path: str = "data/sso_localstorage.json"
 ) -> None:
@@ -160,51 +333,169 @@ def download_monitoring_usulan(
     }
 
     req = Request(API_URL, headers=headers, method="GET")
-    max_retries = 3
-    body = None
-    for attempt in range(max_retries):
-        try:
-            with urlopen(req, timeout=600) as resp:
-                status = resp.getcode()
-                body = resp.read()
-                if status != 200:
-                    raise HTTPError(API_URL, status, f"HTTP {status}", resp.headers, None)
-            break  # Success, exit retry loop
-        except (HTTPError, URLError, IncompleteRead) as e:
-            if attempt == max_retries - 1:
-                if isinstance(e, HTTPError):
-                    detail = None
-                    try:
-                        detail = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
-                    except Exception:
-                        pass
-                    msg = f"Request failed: {e.code} {e.reason}"
-                    if detail:
-                        msg += f"\n{detail}"
-                    raise RuntimeError(msg)
-                elif isinstance(e, IncompleteRead):
-                    raise RuntimeError(f"Incomplete read after {max_retries} attempts: {e}")
-                else:
-                    raise RuntimeError(f"Network error after {max_retries} attempts: {e.reason}")
-            print(f"Attempt {attempt + 1} failed: {e}. Retrying in {2 ** attempt} seconds...")
-            time.sleep(2 ** attempt)
-
-    if body is None:
-        raise RuntimeError("Failed to retrieve response body")
+    try:
+        body = siasn_retry.call(lambda timeout: _read_body(req, timeout), "monitoring")
+    except REQUEST_ERRORS as e:
+        raise RuntimeError(_failure_message(e))
 
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, "wb") as f:
         f.write(body)
 
 
+def _monitoring_page_url(per_page: int, offset: int) -> str:
+    return (
+        "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/usulan/monitoring"
+        f"?no_peserta=&nama=&tgl_usulan=&jenis_pengadaan_id=02&jenis_formasi_id=&status_usulan=&periode=2024"
+        f"&limit={per_page}&offset={offset}"
+    )
+
+
+def _fetch_monitoring_page(url: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    req = Request(url, headers=headers, method="GET")
+    try:
+        body = siasn_retry.call(lambda timeout: _read_body(req, timeout), "monitoring_page")
+    except REQUEST_ERRORS as e:
+        raise RuntimeError(_failure_message(e))
+    return json.loads(body)
+
+
+# Start of a ``"data": [`` array in a raw monitoring page
+_PAGE_DATA_KEY = re.compile(rb'"data"\s*:\s*\[')
+_NON_SPACE = re.compile(rb"\S")
+# One bracket (group 1: opening, group 2: closing) or string that needs a
+# real string match, after a run of plain JSON and simple strings (no
+# brackets, escapes); the runs are skipped in C, so the Python loop only
+# sees the brackets
+_JSON_TOKEN = re.compile(
+    rb'(?:[^"\[\]{}]+|"[^"\\\[\]{}]*")*(?:([\[{])|([\]}])|"[^"\\]*(?:\\.[^"\\]*)*")'
+)
+
+
+def _scan_brackets(body: bytes, pos: int, end: int, depth: int = 0, stop_at: int | None = None) -> tuple[int, int]:
+    """Follow ``{}``/``[]`` nesting over ``body[pos:end]``, skipping strings.
+
+    Returns ``(depth, pos)`` at ``end``, or right after the closing bracket
+    that brings the depth down to ``stop_at``.
+    """
+    for m in _JSON_TOKEN.finditer(body, pos, end):
+        if m.lastindex == 1:
+            depth += 1
+        elif m.lastindex == 2:
+            depth -= 1
+            if depth == stop_at:
+                return depth, m.end()
+    return depth, end
+
+
+def _split_monitoring_page(body: bytes) -> tuple[int, int, int | None] | None:
+    """Locate the ``data`` array in a raw page without decoding its items.
+
+    Returns ``(start, end, meta_total)`` where ``body[start:end]`` is the
+    array content between the brackets. The ``"data"`` key must sit directly
+    in the top-level object and its closing bracket is found by following
+    the nesting (strings skipped); only the small frame around the array
+    (``{"data":[], "meta":{...}}``) is decoded. ``None`` when the page does
+    not have that shape.
+    """
+    m = _PAGE_DATA_KEY.search(body)
+    if m is None or _scan_brackets(body, 0, m.start())[0] != 1:
+        return None
+    depth, after = _scan_brackets(body, m.end(), len(body), depth=1, stop_at=0)
+    if depth != 0:
+        return None
+    end = after - 1
+    try:
+        frame = json.loads(body[: m.end() - 1] + b"[]" + body[after:])
+    except ValueError:
+        return None
+    if not isinstance(frame, dict) or frame.get("data") != []:
+        return None
+    meta = frame.get("meta")
+    total = meta.get("total") if isinstance(meta, dict) else None
+    return m.end(), end, total if isinstance(total, int) else None
+
+
+def _fetch_monitoring_page_raw(url: str, headers: Dict[str, str]) -> tuple[memoryview, int | None]:
+    """Fetch one page as raw bytes: ``(data array content, meta.total)``.
+
+    The content is a view into the response body, ready to be copied into
+    the ``{"data":[...]}`` file as is (items separated by commas, without
+    the brackets). Pages of another shape are decoded and re-encoded.
+    """
+    req = Request(url, headers=headers, method="GET")
+    try:
+        body = siasn_retry.call(lambda timeout: _read_body(req, timeout), "monitoring_page")
+    except REQUEST_ERRORS as e:
+        raise RuntimeError(_failure_message(e))
+    bounds = _split_monitoring_page(body)
+    if bounds is not None:
+        start, end, total = bounds
+        return memoryview(body)[start:end], total
+    resp_json = json.loads(body)
+    page_data = resp_json.get("data", []) if isinstance(resp_json, dict) else []
+    meta = resp_json.get("meta") if isinstance(resp_json, dict) else None
+    total = meta.get("total") if isinstance(meta, dict) else None
+    content = json.dumps(page_data, ensure_ascii=False).encode("utf-8")[1:-1]
+    return memoryview(content), total if isinstance(total, int) else None
+
+
+def _lookup_no_peserta(
+    no_peserta: str, headers: Dict[str, str], bucket: TokenBucket
+) -> list | None:
+    """Fetch the monitoring ``data`` list for one no_peserta; ``None`` on failure."""
+    print(f"Mencari data untuk no_peserta: {no_peserta}")
+    url = (
+        "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/usulan/monitoring"
+        f"?no_peserta={no_peserta}&nama=&tgl_usulan=&jenis_pengadaan_id=02&jenis_formasi_id=&status_usulan=&periode=2024&limit=1&offset=0"
+    )
+    req = Request(url, headers=headers, method="GET")
+
+    def _attempt(timeout: tuple[float, float]) -> bytes:
+        bucket.acquire()
+        return _read_body(req, timeout)
+
+    try:
+        body = siasn_retry.call(_attempt, "lookup_no_peserta")
+    except REQUEST_ERRORS as e:
+        print(_failure_message(e, f" for {no_peserta}"))
+        return None
+    try:
+        resp_json = json.loads(body)
+    except ValueError as e:
+        print(f"Respon tidak valid untuk {no_peserta}: {e}")
+        return None
+    page_data = resp_json.get("data", []) if isinstance(resp_json, dict) else []
+    return page_data or []
+
+
 def download_monitoring_usulan_paginated(
     out_path: str,
     localstorage_path: str = "data/sso_localstorage.json",
     per_page: int = 10000,
+    page_workers: int | None = None,
+    store: MonitoringStore | None = None,
 ) -> None:
+    """Download all monitoring pages into a single ``{"data":[...]}`` JSON file.
+
+    The first page provides ``meta.total``; the remaining offsets are then
+    fetched concurrently (``page_workers``, env ``MONITORING_PAGE_WORKERS``,
+    default 4) while pages are still written in offset order. Set
+    ``page_workers=1`` for the old strictly sequential behaviour. The items
+    are never decoded: the raw bytes of each page's ``data`` array are
+    copied into the file, and each page's ``meta.total`` decides whether
+    another page follows.
+
+    When ``store`` is given the pages replace the store's contents instead
+    and ``out_path`` is not written (use ``MonitoringStore.export_json``).
+    """
     print("Downloading monitoring_usulan data with pagination...")
     token = load_sso_token(localstorage_path)
 
+    if page_workers is None:
+        page_workers = env_int("MONITORING_PAGE_WORKERS", 4)
+    page_workers = max(1, page_workers)
+
     headers = {
         "Accept": "application/json, text/plain, */*",
         "Accept-Language": "en-US,en;q=0.9,id;q=0.8",
@@ -225,83 +516,166 @@ def download_monitoring_usulan_paginated(
         "sec-ch-ua-platform": '"Windows"',
     }
 
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write('{"data":[')
-        offset = 0
-        total = None
-        first = True
-        while True:
-            url = (
-                "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/usulan/monitoring"
-                f"?no_peserta=&nama=&tgl_usulan=&jenis_pengadaan_id=02&jenis_formasi_id=&status_usulan=&periode=2024"
-                f"&limit={per_page}&offset={offset}"
-            )
-            req = Request(url, headers=headers, method="GET")
-            max_retries = 3
-            body = None
-            for attempt in range(max_retries):
-                try:
-                    with urlopen(req, timeout=600) as resp:
-                        status = resp.getcode()
-                        body = resp.read()
-                        if status != 200:
-                            raise HTTPError(
-                                url, status, f"HTTP {status}", resp.headers, None
-                            )
-                    break  # Success
-                except (HTTPError, URLError, IncompleteRead) as e:
-                    if attempt == max_retries - 1:
-                        if isinstance(e, HTTPError):
-                            detail = None
-                            try:
-                                detail = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
-                            except Exception:
-                                pass
-                            msg = f"Request failed: {e.code} {e.reason}"
-                            if detail:
-                                msg += f"\n{detail}"
-                            raise RuntimeError(msg)
-                        elif isinstance(e, IncompleteRead):
-                            raise RuntimeError(f"Incomplete read after {max_retries} attempts: {e}")
-                        else:
-                            raise RuntimeError(f"Network error after {max_retries} attempts: {e.reason}")
-                    print(f"Attempt {attempt + 1} failed: {e}. Retrying in {2 ** attempt} seconds...")
-                    time.sleep(2 ** attempt)
-
-            if body is None:
-                raise RuntimeError("Failed to retrieve response body")
-
-            resp_json = json.loads(body)
-            if total is None:
-                total = resp_json.get("meta", {}).get("total", 0)
-                print(f"Total data: {total}")
-            page_data = resp_json.get("data", [])
+    # With a store the pages are written to SQLite in one transaction (the
+    # previous snapshot stays readable until commit); otherwise the raw bytes
+    # of each page's data array are copied to JSON without decoding items.
+    f = None
+    if store is None:
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        f = open(out_path, "wb")
+        f.write(b'{"data":[')
+        fetch_page = _fetch_monitoring_page_raw
+    else:
+        store.begin_replace()
+        fetch_page = _fetch_monitoring_page
+    first = True
+
+    def _write_page(offset: int, page) -> tuple[bool, int | None]:
+        """Write one page; return (another page follows, meta.total)."""
+        nonlocal first
+        if f is None:
+            page_data = page.get("data", [])
             print(f"Fetched {len(page_data)} items (offset {offset})")
+            store.insert_many(page_data)
+            return len(page_data) >= per_page, page.get("meta", {}).get("total", 0) or 0
+        content, total = page
+        print(f"Fetched {len(content) / 1024:.0f} KB (offset {offset})")
+        if _NON_SPACE.search(content) is None:
+            return False, total
+        if not first:
+            f.write(b",")
+        f.write(content)
+        first = False
+        # Items are not counted; meta.total of the page tells whether more follow
+        return total is None or offset + per_page < total, total
+
+    try:
+        # First page gives meta.total
+        more, total = _write_page(0, fetch_page(_monitoring_page_url(per_page, 0), headers))
+        total = total or 0
+        print(f"Total data: {total}")
+        offset = per_page
+
+        if more and page_workers > 1 and total > offset:
+            # Fetch the known offsets concurrently; keep at most `page_workers`
+            # pages in flight and write them strictly in offset order.
+            offsets = list(range(offset, total, per_page))
+            print(f"Fetching {len(offsets)} remaining pages with {page_workers} workers...")
+            pending: deque = deque()
+            with ThreadPoolExecutor(max_workers=page_workers) as ex:
+                it_offsets = iter(offsets)
+                for off in it_offsets:
+                    pending.append((off, ex.submit(fetch_page, _monitoring_page_url(per_page, off), headers)))
+                    if len(pending) >= page_workers:
+                        break
+                while pending:
+                    off, fut = pending.popleft()
+                    more, _ = _write_page(off, fut.result())
+                    nxt = next(it_offsets, None)
+                    if nxt is not None:
+                        pending.append((nxt, ex.submit(fetch_page, _monitoring_page_url(per_page, nxt), headers)))
+            offset = offsets[-1] + per_page
+
+        # Sequential tail: used when page_workers == 1 or when the total grew
+        # while we were fetching (last page still full)
+        while more:
+            more, _ = _write_page(offset, fetch_page(_monitoring_page_url(per_page, offset), headers))
+            offset += per_page
+        if f is not None:
+            f.write(b"]}")
+        else:
+            store.commit()
+    except BaseException:
+        if store is not None:
+            store.rollback()
+        raise
+    finally:
+        if f is not None:
+            f.close()
+    print(f"Saved all data to {store.db_path if store is not None else out_path}")
+    _print_pool_stats("monitoring")
 
-            for item in page_data:
-                if not first:
-                    f.write(",")
-                f.write(json.dumps(item, ensure_ascii=False))
-                first = False
 
-            if len(page_data) < per_page:
-                break
-            offset += per_page
-            time.sleep(1)
-        f.write("]}")
-    print(f"Saved all data to {out_path}")
+EXCEL_HEADERS = [
+    "No. Peserta", "NIP", "Gelar Depan", "Nama", "Gelar Belakang", "Status Usulan", "Unit Kerja",
+    "Tingkat Pendidikan", "Pendidikan Sesuai Formasi", "TMT Mulai", "TMT Selesai", "Drive URL", "Drive URL SK",
+]
+
+
+class MonitoringSheet:
+    """Rows of monitoring_usulan.xlsx kept in memory until one final write.
+
+    The document stages fill in Drive links with `set_links`, so the
+    workbook is written once (write-only/streaming) and never loaded back.
+    """
+
+    def __init__(self) -> None:
+        self.rows: list[list[str]] = []
+        self._rows_by_no_peserta: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def append(self, row: list[str]) -> None:
+        key = str(row[0] or "").strip()
+        if key:
+            self._rows_by_no_peserta.setdefault(key, []).append(len(self.rows))
+        self.rows.append(row)
+
+    def set_links(self, column: str, links: dict[str, str]) -> int:
+        """Set `column` for rows whose No. Peserta is in `links`; returns the rows updated."""
+        col = EXCEL_HEADERS.index(column)
+        updated = 0
+        for no_peserta, url in links.items():
+            for idx in self._rows_by_no_peserta.get(no_peserta.strip(), ()):
+                self.rows[idx][col] = url
+                updated += 1
+        return updated
+
+    def content_md5(self) -> str:
+        """MD5 of the cell values; stable across saves unlike the xlsx bytes."""
+        payload = json.dumps([EXCEL_HEADERS] + self.rows, ensure_ascii=False)
+        return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+    def save(self, excel_path: str) -> None:
+        if Workbook is None:
+            raise RuntimeError(
+                "openpyxl not available. Please install it (e.g., pip install openpyxl)."
+            )
+        os.makedirs(os.path.dirname(excel_path) or ".", exist_ok=True)
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("monitoring_usulan")
+        for col_idx in range(1, len(EXCEL_HEADERS) + 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = 50
+        ws.append(EXCEL_HEADERS)
+        for row in self.rows:
+            ws.append(row)
+        wb.save(excel_path)
 
 
 def convert_monitoring_json_to_excel(
     json_path: str,
     excel_path: str,
     pertek_drive_folder_id: str | None = None,
-) -> None:
+    sk_drive_folder_id: str | None = None,
+    records: MonitoringRecordTable | None = None,
+    save: bool = True,
+) -> MonitoringSheet:
     """Convert monitoring_usulan JSON into an Excel file dengan No. Peserta terpilih.
 
     Jika `pertek_drive_folder_id` diberikan, cek file Pertek yang sudah
     ada di Google Drive (judul file) dan isi kolom "Drive URL" otomatis.
+    Begitu juga `sk_drive_folder_id` untuk kolom "Drive URL SK", sehingga
+    link SK tetap terisi walaupun dokumennya tidak diunggah ulang siklus ini.
+
+    `records` adalah tabel record hasil satu kali parsing JSON (lihat
+    `monitoring_records.load_monitoring_records`); item yang ditemukan lewat
+    pencarian no_peserta ditambahkan ke tabel tersebut dan ke JSON (atau ke
+    SQLite bila tabel memakai `MonitoringStore`).
+
+    Baris dikembalikan sebagai `MonitoringSheet`. Dengan `save=False` file
+    belum ditulis: tahap Pertek/SK mengisi link ke sheet tersebut lalu
+    pemanggil menulisnya sekali dengan `sheet.save(excel_path)`.
     """
     print("Converting JSON to Excel (streaming)...")
     if Workbook is None:
@@ -309,10 +683,9 @@ def convert_monitoring_json_to_excel(
             "openpyxl not available. Please install it (e.g., pip install openpyxl)."
         )
 
-    if not os.path.exists(json_path):
+    if records is None and not os.path.exists(json_path):
         raise FileNotFoundError(f"JSON file not found: {json_path}")
 
-    os.makedirs(os.path.dirname(excel_path), exist_ok=True)
     # Siapkan peta judul->link dari folder Drive berisi PDF Pertek (opsional)
     drive_title_link_map: dict[str, str] = {}
     if pertek_drive_folder_id:
@@ -322,50 +695,32 @@ def convert_monitoring_json_to_excel(
         except Exception as e:
             print(f"Peringatan: gagal memuat daftar file Pertek dari Drive: {e}")
             drive_title_link_map = {}
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "monitoring_usulan"
-    ws.append(["No. Peserta", "NIP", "Gelar Depan", "Nama", "Gelar Belakang", "Status Usulan", "Unit Kerja", "Tingkat Pendidikan", "Pendidikan Sesuai Formasi", "TMT Mulai", "TMT Selesai", "Drive URL", "Drive URL SK"])
-    for col_idx in range(1, 14):
-        col_letter = ws.cell(row=1, column=col_idx).column_letter
-        ws.column_dimensions[col_letter].width = 50
+    sk_title_link_map: dict[str, str] = {}
+    if sk_drive_folder_id:
+        try:
+            from drive_upload import list_title_to_link_map  # type: ignore
+            sk_title_link_map = list_title_to_link_map(sk_drive_folder_id)
+        except Exception as e:
+            print(f"Peringatan: gagal memuat daftar file SK dari Drive: {e}")
+            sk_title_link_map = {}
+    sheet = MonitoringSheet()
 
     processed_no_peserta = set()  # Set untuk melacak unik
     missing_count = 0
 
-    with open(json_path, "r", encoding="utf-8") as f:
-        for it in ijson.items(f, "data.item"):
-            nested = (it or {}).get("usulan_data") or {}
-            nested_data = nested.get("data") or {}
-            no_peserta = nested_data.get("no_peserta") or ""
-            if no_peserta not in selected_no_peserta:
-                continue
-            if no_peserta in processed_no_peserta:
-                print(f"Duplikasi dilewati: {no_peserta}")
-                continue  # Lewati duplikasi
-            processed_no_peserta.add(no_peserta)
-            nama = (it or {}).get("nama") or nested_data.get("nama") or ""
-            status_usulan = (it or {}).get("status_usulan") or ""
-            status_id = str(status_usulan)
-            status_usulan_name = STATUS_USULAN_MAP.get(status_id, status_id)
-            nip = (it or {}).get("nip") or ""
-            unor_nama = nested_data.get("unor_nama") or ""
-            glr_depan = nested_data.get("glr_depan") or ""
-            glr_belakang = nested_data.get("glr_belakang") or ""
-            tgl_kontrak_mulai = nested_data.get("tgl_kontrak_mulai") or ""
-            tgl_kontrak_akhir = nested_data.get("tgl_kontrak_akhir") or ""
-            tk_pendidikan_id = nested_data.get("tk_pendidikan_id") or ""
-            tingkat_pendidikan = TINGKAT_PENDIDIKAN_MAP.get(tk_pendidikan_id, tk_pendidikan_id)
-            pendidikan_pertama_nama = nested_data.get("pendidikan_pertama_nama") or ""
-            title_base = _sanitize_filename(
-                f"Pertek_{nip}_{nama}" if (nip and nama) else (f"Pertek_{nip}" if nip else "")
-            )
-            drive_url = drive_title_link_map.get(title_base, "") if title_base else ""
-            ws.append([no_peserta, nip, glr_depan, nama, glr_belakang, status_usulan_name, unor_nama, tingkat_pendidikan, pendidikan_pertama_nama, tgl_kontrak_mulai, tgl_kontrak_akhir, drive_url, ""])
-            if not no_peserta:
-                missing_count += 1
-
-    missing_no_peserta = selected_no_peserta - processed_no_peserta
+    if records is None:
+        records = load_monitoring_records(json_path)
+    for rec in records:
+        no_peserta = rec.no_peserta
+        if no_peserta in processed_no_peserta:
+            print(f"Duplikasi dilewati: {no_peserta}")
+            continue  # Lewati duplikasi
+        processed_no_peserta.add(no_peserta)
+        sheet.append(_excel_row(rec, drive_title_link_map, sk_title_link_map))
+        if not no_peserta:
+            missing_count += 1
+
+    missing_no_peserta = records.selected - processed_no_peserta
     print(f"Total no_peserta tidak ditemukan: {len(missing_no_peserta)}")
 
     # Load token for additional requests
@@ -395,161 +750,74 @@ def convert_monitoring_json_to_excel(
     # Tampung item baru yang ditemukan saat pencarian untuk ditambahkan ke JSON
     new_items_to_append: list[dict] = []
 
-    for no_peserta in missing_no_peserta:
-        print(f"Mencari data untuk no_peserta: {no_peserta}")
-        url = (
-            "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/usulan/monitoring"
-            f"?no_peserta={no_peserta}&nama=&tgl_usulan=&jenis_pengadaan_id=02&jenis_formasi_id=&status_usulan=&periode=2024&limit=1&offset=0"
-        )
-        req = Request(url, headers=headers, method="GET")
-        max_retries = 3
-        body = None
-        for attempt in range(max_retries):
-            try:
-                with urlopen(req, timeout=600) as resp:
-                    status = resp.getcode()
-                    body = resp.read()
-                    if status != 200:
-                        raise HTTPError(url, status, f"HTTP {status}", resp.headers, None)
-                break  # Success
-            except (HTTPError, URLError, IncompleteRead) as e:
-                if attempt == max_retries - 1:
-                    if isinstance(e, HTTPError):
-                        detail = None
-                        try:
-                            detail = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
-                        except Exception:
-                            pass
-                        msg = f"Request failed for {no_peserta}: {e.code} {e.reason}"
-                        if detail:
-                            msg += f"\n{detail}"
-                        print(msg)
-                        continue
-                    elif isinstance(e, IncompleteRead):
-                        print(f"Incomplete read for {no_peserta} after {max_retries} attempts: {e}")
-                        continue
-                    else:
-                        print(f"Network error for {no_peserta} after {max_retries} attempts: {e.reason}")
-                        continue
-                print(f"Attempt {attempt + 1} for {no_peserta} failed: {e}. Retrying in {2 ** attempt} seconds...")
-                time.sleep(2 ** attempt)
-
-        if body is None:
+    # Pencarian berjalan paralel (MISSING_LOOKUP_WORKERS) dan dibatasi token
+    # bucket (MISSING_LOOKUP_RPS); hasil digabung berurutan menurut no_peserta
+    # sehingga baris Excel dan item yang ditambahkan ke JSON tetap stabil.
+    ordered_missing = sorted(missing_no_peserta)
+    lookups: dict[str, list | None] = {}
+    if ordered_missing:
+        lookup_workers = env_int("MISSING_LOOKUP_WORKERS", 4, minimum=1)
+        lookup_rps = env_float("MISSING_LOOKUP_RPS", 2.0)
+        bucket = TokenBucket(lookup_rps)
+        print(f"Mencari {len(ordered_missing)} no_peserta ({lookup_workers} worker, maks {lookup_rps:g} request/detik)...")
+        with ThreadPoolExecutor(max_workers=lookup_workers) as ex:
+            futures = {ex.submit(_lookup_no_peserta, np_value, headers, bucket): np_value for np_value in ordered_missing}
+            for fut in as_completed(futures):
+                np_value = futures[fut]
+                try:
+                    lookups[np_value] = fut.result()
+                except Exception as e:
+                    # One bad answer must not abort the whole sheet
+                    print(f"Pencarian {np_value} gagal: {e}")
+                    lookups[np_value] = None
+
+    for no_peserta in ordered_missing:
+        page_data = lookups.get(no_peserta)
+        if page_data is None:
             print(f"Failed to retrieve response body for {no_peserta}")
             continue
-
-        resp_json = json.loads(body)
-        page_data = resp_json.get("data", [])
         if page_data:
             item = page_data[0]
-            nested = (item or {}).get("usulan_data") or {}
-            nested_data = nested.get("data") or {}
-            nama = (item or {}).get("nama") or nested_data.get("nama") or ""
-            status_usulan = (item or {}).get("status_usulan") or ""
-            status_id = str(status_usulan)
-            status_usulan_name = STATUS_USULAN_MAP.get(status_id, status_id)
-            nip = (item or {}).get("nip") or ""
-            unor_nama = nested_data.get("unor_nama") or ""
-            glr_depan = nested_data.get("glr_depan") or ""
-            glr_belakang = nested_data.get("glr_belakang") or ""
-            tgl_kontrak_mulai = nested_data.get("tgl_kontrak_mulai") or ""
-            tgl_kontrak_akhir = nested_data.get("tgl_kontrak_akhir") or ""
-            tk_pendidikan_id = nested_data.get("tk_pendidikan_id") or ""
-            tingkat_pendidikan = TINGKAT_PENDIDIKAN_MAP.get(tk_pendidikan_id, tk_pendidikan_id)
-            pendidikan_pertama_nama = nested_data.get("pendidikan_pertama_nama") or ""
-            title_base = _sanitize_filename(
-                f"Pertek_{nip}_{nama}" if (nip and nama) else (f"Pertek_{nip}" if nip else "")
-            )
-            drive_url = drive_title_link_map.get(title_base, "") if title_base else ""
-            ws.append([no_peserta, nip, glr_depan, nama, glr_belakang, status_usulan_name, unor_nama, tingkat_pendidikan, pendidikan_pertama_nama, tgl_kontrak_mulai, tgl_kontrak_akhir, drive_url, ""])
+            rec = MonitoringRecord.from_item(item if isinstance(item, dict) else {})
+            sheet.append(_excel_row(rec, drive_title_link_map, sk_title_link_map, no_peserta=no_peserta))
             print(f"Data ditemukan dan ditambahkan untuk {no_peserta}")
             # Simpan item untuk ditambahkan ke monitoring_usulan.json
             if isinstance(item, dict):
                 new_items_to_append.append(item)
         else:
             # Tanpa data item, tidak punya NIP/Nama untuk menebak judul Pertek -> kosongkan
-            ws.append([no_peserta, "", "", "Tidak Ditemukan", "", "Tidak Ditemukan", "", "", "", "", "", "", ""])  # no link
+            sheet.append([no_peserta, "", "", "Tidak Ditemukan", "", "Tidak Ditemukan", "", "", "", "", "", "", ""])  # no link
             print(f"Data masih tidak ditemukan untuk {no_peserta}")
-        time.sleep(1)  # Delay to avoid rate limiting
 
-    # Setelah semua pencarian selesai, tambahkan item yang ditemukan ke JSON sumber
-    # Lakukan dengan merge streaming agar tidak memakan memori besar (menghindari container mati)
+    # Setelah semua pencarian selesai, tambahkan item yang ditemukan ke JSON sumber.
+    # Deduplikasi memakai tabel record (tanpa parsing ulang) lalu isi file
+    # disalin byte demi byte ke .tmp bersama item baru dan diganti secara atomik.
     if new_items_to_append:
         try:
-            temp_path = json_path + ".tmp"
-            existing_ids: set[str] = set()
-            existing_np: set[str] = set()
-
-            # Tulis ulang file JSON secara streaming + sisipkan item baru di akhir
-            with open(temp_path, "w", encoding="utf-8") as out_f:
-                out_f.write('{"data":[')
-                first = True
-
-                # Baca data lama secara streaming dan salin apa adanya (dump kembali)
-                try:
-                    with open(json_path, "r", encoding="utf-8") as in_f:
-                        for it in ijson.items(in_f, "data.item"):
-                            if not isinstance(it, dict):
-                                continue
-                            # Kumpulkan kunci unik untuk deduplikasi
-                            idv = (
-                                (it.get("id") or "").strip()
-                                if isinstance(it.get("id"), str)
-                                else str(it.get("id")) if it.get("id") is not None else ""
-                            )
-                            nested = (it.get("usulan_data") or {}) if isinstance(it.get("usulan_data"), dict) else {}
-                            nested_data = (nested.get("data") or {}) if isinstance(nested.get("data"), dict) else {}
-                            npv = (nested_data.get("no_peserta") or "").strip()
-                            if idv:
-                                existing_ids.add(idv)
-                            if npv:
-                                existing_np.add(npv)
-
-                            if not first:
-                                out_f.write(",")
-                            out_f.write(json.dumps(it, ensure_ascii=False))
-                            first = False
-                except (json.JSONDecodeError, FileNotFoundError):
-                    # Jika file belum ada/korup, kita akan memulai dari nol di bawah
-                    pass
-
-                # Tambahkan item baru yang belum ada
-                appended = 0
-                for it in new_items_to_append:
-                    if not isinstance(it, dict):
-                        continue
-                    idv = (
-                        (it.get("id") or "").strip()
-                        if isinstance(it.get("id"), str)
-                        else str(it.get("id")) if it.get("id") is not None else ""
-                    )
-                    nested = (it.get("usulan_data") or {}) if isinstance(it.get("usulan_data"), dict) else {}
-                    nested_data = (nested.get("data") or {}) if isinstance(nested.get("data"), dict) else {}
-                    npv = (nested_data.get("no_peserta") or "").strip()
-                    if (idv and idv in existing_ids) or (npv and npv in existing_np):
-                        continue
-                    if not first:
-                        out_f.write(",")
-                    out_f.write(json.dumps(it, ensure_ascii=False))
-                    first = False
-                    if idv:
-                        existing_ids.add(idv)
-                    if npv:
-                        existing_np.add(npv)
-                    appended += 1
-
-                out_f.write("]}")
-
-            # Ganti file asli dengan yang baru secara atomik
-            os.replace(temp_path, json_path)
+            to_append: list[dict] = []
+            for it in new_items_to_append:
+                rec = MonitoringRecord.from_item(it)
+                if records.is_known(rec.id.strip(), rec.no_peserta.strip()):
+                    continue
+                records.add_item(it)
+                to_append.append(it)
+            if records.store is not None:
+                appended = records.store.insert_many(to_append)
+                records.store.commit()
+                target = records.store.db_path
+            else:
+                appended = append_items_to_monitoring_json(json_path, to_append)
+                target = json_path
             if appended:
-                print(f"Ditambahkan {appended} item baru ke {json_path}")
+                print(f"Ditambahkan {appended} item baru ke {target}")
         except Exception as e:
-            print(f"Gagal menambahkan item ke JSON (stream-merge): {e}")
+            print(f"Gagal menambahkan item ke JSON (append): {e}")
 
     print(f"Total item diproses: {len(processed_no_peserta)}")
     print(f"Item dengan no_peserta kosong: {missing_count}")
-    wb.save(excel_path)
+    if save:
+        sheet.save(excel_path)
+    return sheet
 
 
 def _sanitize_filename(name: str) -> str:
@@ -560,34 +828,229 @@ def _sanitize_filename(name: str) -> str:
     return sanitized.strip(' .')
 
 
+def _excel_row(
+    rec: MonitoringRecord,
+    pertek_links: dict[str, str],
+    sk_links: dict[str, str],
+    no_peserta: str | None = None,
+) -> list[str]:
+    """Build one monitoring_usulan.xlsx row from a record."""
+    nama = rec.nama or rec.nested_nama
+    nip = rec.nip
+    status_usulan_name = STATUS_USULAN_MAP.get(rec.status_id, rec.status_id)
+    tingkat_pendidikan = TINGKAT_PENDIDIKAN_MAP.get(rec.tk_pendidikan_id, rec.tk_pendidikan_id)
+    title_base = _sanitize_filename(
+        f"Pertek_{nip}_{nama}" if (nip and nama) else (f"Pertek_{nip}" if nip else "")
+    )
+    drive_url = pertek_links.get(title_base, "") if title_base else ""
+    sk_title = _sanitize_filename(f"SK_{nip}_{nama}" if nama else f"SK_{nip}") if nip else ""
+    drive_url_sk = sk_links.get(sk_title, "") if sk_title else ""
+    return [
+        rec.no_peserta if no_peserta is None else no_peserta,
+        nip,
+        rec.glr_depan,
+        nama,
+        rec.glr_belakang,
+        status_usulan_name,
+        rec.unor_nama,
+        tingkat_pendidikan,
+        rec.pendidikan_pertama_nama,
+        rec.tgl_kontrak_mulai,
+        rec.tgl_kontrak_akhir,
+        drive_url,
+        drive_url_sk,
+    ]
+
+
+def _run_document_pipeline(
+    label: str,
+    tasks: List[Dict[str, str]],
+    download_fn: Callable[[Dict[str, str]], tuple[Dict[str, str], str | None]],
+    upload_fn: Callable[[Dict[str, str], str], None] | None,
+    download_workers: int,
+    upload_workers: int,
+    queue_size: int | None = None,
+    budget: CycleBudget | None = None,
+) -> List[Dict[str, str]]:
+    """Run document downloads and Drive uploads as two pipelined stages.
+
+    ``download_fn`` returns ``(result, path_to_upload_or_None)``; finished
+    downloads go through a bounded queue to ``upload_workers`` upload threads.
+    A full queue blocks the download workers (backpressure), so a slow Drive
+    does not pile up PDFs on disk and SIASN is not hammered ahead of it.
+    Queue depth and stage utilization are logged periodically and at the end.
+    Once ``budget`` has expired, tasks not started yet are not run; they come
+    back as ``{"no_peserta": ..., "deferred": "1"}`` (downloads in flight
+    finish and are uploaded). A ``download_fn`` that raises yields
+    ``{"no_peserta": ..., "saved": "0"}``, so every task has a result.
+    """
+    if queue_size is None:
+        queue_size = env_int("UPLOAD_QUEUE_SIZE", upload_workers * 2, minimum=1)
+    upload_q: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+    results: List[Dict[str, str]] = []
+    results_lock = threading.Lock()
+    busy = {"download": 0.0, "upload": 0.0}
+    active = {"download": 0, "upload": 0}
+    stats_lock = threading.Lock()
+    max_depth = 0
+    deferred = 0
+    done = threading.Event()
+    started = time.monotonic()
+
+    def _timed(stage: str, fn, *args):
+        with stats_lock:
+            active[stage] += 1
+            PIPELINE_ACTIVE.set(active[stage], pipeline=label, stage=stage)
+        t0 = time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.monotonic() - t0
+            PIPELINE_STEP.observe(elapsed, pipeline=label, stage=stage)
+            with stats_lock:
+                active[stage] -= 1
+                busy[stage] += elapsed
+                PIPELINE_ACTIVE.set(active[stage], pipeline=label, stage=stage)
+
+    def _download_stage(task: Dict[str, str]) -> None:
+        nonlocal max_depth, deferred
+        if budget is not None and budget.expired():
+            with results_lock:
+                results.append({"no_peserta": task["no_peserta"], "deferred": "1"})
+                deferred += 1
+            return
+        try:
+            res, path = _timed("download", download_fn, task)
+        except Exception as e:
+            # Still report the task as failed so the caller retries it next cycle
+            print(f"Task error ({label}) untuk {task['no_peserta']}: {e}")
+            with results_lock:
+                results.append({"no_peserta": task["no_peserta"], "saved": "0"})
+            return
+        if upload_fn is not None and path:
+            upload_q.put((res, path))  # blocks while the upload stage is behind
+            with stats_lock:
+                max_depth = max(max_depth, upload_q.qsize())
+        else:
+            with results_lock:
+                results.append(res)
+
+    def _upload_stage() -> None:
+        while True:
+            item = upload_q.get()
+            try:
+                if item is None:
+                    return
+                res, path = item
+                try:
+                    _timed("upload", upload_fn, res, path)
+                except Exception as e:
+                    print(f"Task upload error ({label}): {e}")
+                with results_lock:
+                    results.append(res)
+            finally:
+                upload_q.task_done()
+
+    def _monitor() -> None:
+        while not done.wait(10):
+            with stats_lock:
+                print(
+                    f"[{label}] antrian upload {upload_q.qsize()}/{upload_q.maxsize} | "
+                    f"unduh aktif {active['download']}/{download_workers} | "
+                    f"upload aktif {active['upload']}/{upload_workers} | selesai {len(results)}/{len(tasks)}"
+                )
+
+    monitor = threading.Thread(target=_monitor, daemon=True)
+    monitor.start()
+    uploaders = []
+    if upload_fn is not None:
+        for _ in range(upload_workers):
+            t = threading.Thread(target=_upload_stage, daemon=True)
+            t.start()
+            uploaders.append(t)
+    try:
+        with ThreadPoolExecutor(max_workers=download_workers) as ex:
+            futures = [ex.submit(_download_stage, t) for t in tasks]
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"Task error ({label}): {e}")
+    finally:
+        for _ in uploaders:
+            upload_q.put(None)
+        for t in uploaders:
+            t.join()
+        done.set()
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    dl_util = busy["download"] / (elapsed * download_workers) * 100
+    up_util = busy["upload"] / (elapsed * upload_workers) * 100 if uploaders else 0.0
+    print(
+        f"[{label}] pipeline selesai {elapsed:.1f}s | unduh {download_workers} worker, utilisasi {dl_util:.0f}% | "
+        f"upload {len(uploaders)} worker, utilisasi {up_util:.0f}% | antrian maks {max_depth}/{upload_q.maxsize}"
+    )
+    if deferred and budget is not None:
+        print(f"[{label}] anggaran waktu habis: {deferred} task ditunda ke siklus berikutnya")
+        budget.defer(label, deferred)
+    return results
+
+
 def download_pertek_documents_from_json(
     json_path: str,
     out_dir: str = "data/downloads/monitoring_usulan_ttd_pertek",
     localstorage_path: str = "data/sso_localstorage.json",
-    excel_path: str | None = None,
+    sheet: MonitoringSheet | None = None,
     pertek_drive_folder_id: str | None = "1YCHZI7-x2aDZI-K4W_bFhns4IbrEn0WC",
     max_workers: int | None = None,
-) -> None:
+    only_no_peserta: set[str] | None = None,
+    upload_workers: int | None = None,
+    records: MonitoringRecordTable | None = None,
+    tokens: TokenProvider | None = None,
+    budget: CycleBudget | None = None,
+    select: str = "all",
+) -> List[Dict[str, str]]:
     """
     Read monitoring_usulan JSON and download each available Pertek by ID only
     as a PDF from the SIASN document endpoint, using the SSO token.
 
     Only downloads entries whose `no_peserta` is in `selected_no_peserta`.
+    If `only_no_peserta` is given (new/changed records from the delta sync),
+    other entries are skipped unless their PDF is not yet on disk.
+    Entries whose `status_usulan` cannot have a Pertek yet (see
+    `document_gate.allowed_status_ids`) or that recently returned 404 with the
+    same status (negative cache) cost no request at all.
+    Downloads (`max_workers`, env `PERTEK_DOWNLOAD_WORKERS`) and Drive uploads
+    (`upload_workers`, env `PERTEK_UPLOAD_WORKERS`) run as separate pipelined
+    stages; both default to `PERTEK_WORKERS`.
+    Pass `records` (the shared record table) to avoid re-parsing the JSON.
+    Drive links are filled into `sheet` (from `convert_monitoring_json_to_excel`).
+    `tokens` (shared `sso_token.TokenProvider`) supplies the bearer token; on
+    a 401 it is renewed once for all workers and the request is retried.
+    With `only_no_peserta`, new/changed records run before re-checks of
+    missing PDFs; `select` ("pending" or "recheck") limits a call to one of
+    the two groups so the caller can order them across stages. `budget`
+    (`cycle_budget.CycleBudget`) caps request timeouts and retries; tasks not
+    started when it expires are returned with `deferred` set.
+    Returns the per-task results.
 
     Output filenames follow: Pertek_{nip}_{nama}.pdf
     """
     print("Downloading Pertek documents from JSON...")
-    if not os.path.exists(json_path):
+    if records is None and not os.path.exists(json_path):
         raise FileNotFoundError(f"JSON file not found: {json_path}")
 
-    token = load_sso_token(localstorage_path)
+    if tokens is None:
+        tokens = TokenProvider(localstorage_path)
+    tokens.token()  # fail early when there is no token at all
+    if budget is None:
+        budget = CycleBudget()
 
     base_pertek_url = (
         "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/dokumen/pertek/"
     )
     headers = {
         "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
-        "Authorization": f"Bearer {token}",
         "Origin": "https://siasn-instansi.bkn.go.id",
         "Referer": "https://siasn-instansi.bkn.go.id/",
         "User-Agent": (
@@ -599,57 +1062,80 @@ def download_pertek_documents_from_json(
 
     os.makedirs(out_dir, exist_ok=True)
 
-    # Concurrency settings
+    # Concurrency settings: SIASN downloads and Drive uploads are tuned separately
+    default_workers = env_int("PERTEK_WORKERS", 10, minimum=1)
     if max_workers is None:
-        try:
-            max_workers = int(os.getenv("PERTEK_WORKERS", "10"))
-        except ValueError:
-            max_workers = 10
+        max_workers = env_int("PERTEK_DOWNLOAD_WORKERS", default_workers, minimum=1)
+    if upload_workers is None:
+        upload_workers = env_int("PERTEK_UPLOAD_WORKERS", default_workers, minimum=1)
+
+    allowed_ids = allowed_status_ids("pertek")
+    negative_cache = NegativeCache()
 
     # Build task list from JSON (only selected participants)
     tasks: List[Dict[str, str]] = []
-    skipped = 0
-    with open(json_path, "r", encoding="utf-8") as f:
-        for it in ijson.items(f, "data.item"):
-            if not isinstance(it, dict):
-                continue
-            item_id = (it.get("id") or "").strip()
-            if not item_id:
-                skipped += 1
-                continue
-            nip = (it.get("nip") or "").strip()
-            nama = (it.get("nama") or "").strip()
-            nested = (it or {}).get("usulan_data") or {}
-            nested_data = nested.get("data") or {}
-            no_peserta = (nested_data.get("no_peserta") or "").strip()
-
-            if not no_peserta or (no_peserta not in selected_no_peserta):
-                skipped += 1
-                continue
-
-            if not nip:
-                nip = item_id
-            fname_base = _sanitize_filename(
-                f"Pertek_{nip}_{nama}" if nama else f"Pertek_{nip}"
-            )
-            out_file = os.path.join(out_dir, f"{fname_base}.pdf")
-            # SK filename should start with SK_ instead of Pertek_
-            sk_fname_base = _sanitize_filename(
-                f"SK_{nip}_{nama}" if nama else f"SK_{nip}"
-            )
-            tasks.append(
-                {
-                    "item_id": item_id,
-                    "no_peserta": no_peserta,
-                    "pertek_out_file": out_file,
-                    "sk_out_file": os.path.join(out_dir, f"{sk_fname_base}.pdf"),
-                }
-            )
+    rechecks: List[Dict[str, str]] = []
+    unchanged = 0
+    gated = 0
+    cached_missing = 0
+    if records is None:
+        records = load_monitoring_records(json_path)
+    # Items outside the selection were already dropped when building the table
+    skipped = records.total_items - len(records)
+    for rec in records:
+        item_id = rec.id.strip()
+        if not item_id:
+            skipped += 1
+            continue
+        nip = rec.nip.strip()
+        nama = rec.nama.strip()
+        no_peserta = rec.no_peserta.strip()
+
+        status_id = rec.status_id
+        if allowed_ids is not None and status_id not in allowed_ids:
+            gated += 1
+            continue
+
+        if not nip:
+            nip = item_id
+        fname_base = _sanitize_filename(
+            f"Pertek_{nip}_{nama}" if nama else f"Pertek_{nip}"
+        )
+        out_file = os.path.join(out_dir, f"{fname_base}.pdf")
+        recheck = only_no_peserta is not None and no_peserta not in only_no_peserta
+        if recheck and os.path.exists(out_file):
+            unchanged += 1
+            continue
+        if (select == "pending" and recheck) or (select == "recheck" and not recheck):
+            continue
+        if negative_cache.should_skip("pertek", item_id, status_id):
+            cached_missing += 1
+            continue
+        # SK filename should start with SK_ instead of Pertek_
+        sk_fname_base = _sanitize_filename(
+            f"SK_{nip}_{nama}" if nama else f"SK_{nip}"
+        )
+        (rechecks if recheck else tasks).append(
+            {
+                "item_id": item_id,
+                "no_peserta": no_peserta,
+                "status_id": status_id,
+                "pertek_out_file": out_file,
+                "sk_out_file": os.path.join(out_dir, f"{sk_fname_base}.pdf"),
+            }
+        )
+    # New/changed records first, re-checks of missing PDFs after them
+    tasks += rechecks
 
-    print(f"Total Pertek tasks: {len(tasks)} | skipped (filtered): {skipped}")
+    print(
+        f"Total Pertek tasks: {len(tasks)} | skipped (filtered): {skipped} | unchanged: {unchanged} "
+        f"| status belum memungkinkan: {gated} | cache 404: {cached_missing}"
+    )
+    CACHE_HITS.inc(unchanged, cache="delta_pertek")
+    CACHE_HITS.inc(cached_missing, cache="negative_404_pertek")
 
-    # Worker function for parallel download + optional Drive upload
-    def _worker(task: Dict[str, str]) -> Dict[str, str]:
+    # Download stage; returns the file to hand over to the upload stage
+    def _worker(task: Dict[str, str]) -> tuple[Dict[str, str], str | None]:
         item_id = task["item_id"]
         no_peserta = task["no_peserta"]
         pertek_out = task.get("pertek_out_file")
@@ -657,155 +1143,107 @@ def download_pertek_documents_from_json(
 
         results: Dict[str, str] = {"no_peserta": no_peserta, "saved": "0", "drive_url": "", "drive_url_sk": ""}
 
-        # Helper to download a document from a given base url to a target file
-        def _download_doc(base_url: str, target_file: str) -> tuple[bool, str]:
-            url = base_url + item_id
-            req = Request(url, headers=headers, method="GET")
-            body = None
-            last_error = ""
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    with urlopen(req, timeout=600) as resp:
-                        status = resp.getcode()
-                        data = resp.read()
-                        if status == 200 and data:
-                            body = data
-                            break
-                        else:
-                            last_error = f"HTTP {status}"
-                except (HTTPError, URLError, IncompleteRead) as e:
-                    if isinstance(e, HTTPError):
-                        try:
-                            _ = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
-                        except Exception:
-                            pass
-                        last_error = f"{e.code} {e.reason}"
-                    elif isinstance(e, IncompleteRead):
-                        last_error = f"Incomplete read: {e}"
-                    else:
-                        last_error = f"Network error: {getattr(e, 'reason', str(e))}"
-                    if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)
-                    else:
-                        last_error = f"{last_error} after {max_retries} attempts"
-
-            if body is None:
-                return False, last_error
-
-            try:
-                with open(target_file, "wb") as of:
-                    of.write(body)
-                return True, ""
-            except Exception as e:
-                return False, str(e)
-
-        # Download Pertek
-        pertek_ok, pertek_err = _download_doc(base_pertek_url, pertek_out) if pertek_out else (False, "no target")
+        # Download Pertek (streamed to disk, renamed into place when complete)
+        pertek_ok, pertek_msg, pertek_missing = (
+            _download_document(base_pertek_url + item_id, headers, tokens, pertek_out, "pertek", budget)
+            if pertek_out
+            else (False, "no target", False)
+        )
         if pertek_ok:
-            print(f"Saved: {pertek_out}")
+            print(f"Saved: {pertek_out} ({pertek_msg})")
             results["saved"] = "1"
+            negative_cache.clear("pertek", item_id)
         else:
-            print(f"Gagal download Pertek untuk {no_peserta} | {pertek_err}")
-
-        # Upload Pertek to Drive if requested
-        if pertek_ok and pertek_drive_folder_id:
-            try:
-                from drive_upload import upload_file_to_drive  # type: ignore
-
-                title = os.path.splitext(os.path.basename(pertek_out))[0]
-                drive_url = upload_file_to_drive(
-                    pertek_out,
-                    pertek_drive_folder_id,
-                    convert_spreadsheet=False,
-                    replace_by_title=True,
-                    custom_title=title,
-                )
-                results["drive_url"] = drive_url or ""
-            except Exception as e:
-                print(f"Gagal upload ke Drive untuk {pertek_out}: {e}")
-                results["drive_url"] = ""
+            print(f"Gagal download Pertek untuk {no_peserta} | {pertek_msg}")
+            if pertek_missing:
+                negative_cache.record_miss("pertek", item_id, task["status_id"])
 
-        # Short delay
-        time.sleep(0.1)
+        return results, (pertek_out if pertek_ok else None)
 
-        return results
-
-    # Run tasks in parallel
-    downloaded = 0
-    results: List[Dict[str, str]] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = [ex.submit(_worker, t) for t in tasks]
-        for fut in as_completed(futures):
-            try:
-                res = fut.result()
-                results.append(res)
-                if res.get("saved") == "1":
-                    downloaded += 1
-            except Exception as e:
-                print(f"Task error: {e}")
-
-    # Update Excel once at the end to avoid concurrent writes
-    if excel_path and load_workbook is not None and os.path.exists(excel_path):
+    # Upload stage: Pertek to Drive
+    def _upload_worker(results: Dict[str, str], pertek_out: str) -> None:
         try:
-            wb = load_workbook(excel_path)
-            ws = wb.active
-            header_map = {ws.cell(row=1, column=c).value: c for c in range(1, ws.max_column + 1)}
-            col_np = header_map.get("No. Peserta", 1)
-            col_url = header_map.get("Drive URL", None)
-            col_url_sk = header_map.get("Drive URL SK", None)
-
-            # Ensure columns exist
-            if col_url is None:
-                col_url = ws.max_column + 1
-                ws.cell(row=1, column=col_url, value="Drive URL")
-            if col_url_sk is None:
-                col_url_sk = ws.max_column + 1 if col_url is not None and col_url >= ws.max_column else ws.max_column + 1
-                ws.cell(row=1, column=col_url_sk, value="Drive URL SK")
-
-            # Build maps
-            url_map = {r["no_peserta"]: r.get("drive_url", "") for r in results if r.get("drive_url")}
-            url_sk_map = {r["no_peserta"]: r.get("drive_url_sk", "") for r in results if r.get("drive_url_sk")}
-
-            if url_map or url_sk_map:
-                for r in range(2, ws.max_row + 1):
-                    np_val = str(ws.cell(row=r, column=col_np).value or "").strip()
-                    if np_val in url_map:
-                        ws.cell(row=r, column=col_url, value=url_map[np_val])
-                    if np_val in url_sk_map:
-                        ws.cell(row=r, column=col_url_sk, value=url_sk_map[np_val])
-            wb.save(excel_path)
+            from drive_upload import upload_file_to_drive  # type: ignore
+
+            title = os.path.splitext(os.path.basename(pertek_out))[0]
+            drive_url = upload_file_to_drive(
+                pertek_out,
+                pertek_drive_folder_id,
+                convert_spreadsheet=False,
+                replace_by_title=True,
+                custom_title=title,
+            )
+            results["drive_url"] = drive_url or ""
         except Exception as e:
-            print(f"Gagal update Excel (batch): {e}")
+            print(f"Gagal upload ke Drive untuk {pertek_out}: {e}")
+            results["drive_url"] = ""
+
+    results = _run_document_pipeline(
+        "Pertek re-check" if select == "recheck" else "Pertek",
+        tasks,
+        _worker,
+        _upload_worker if pertek_drive_folder_id else None,
+        max_workers,
+        upload_workers,
+        budget=budget,
+    )
+    downloaded = sum(1 for r in results if r.get("saved") == "1")
+    deferred = sum(1 for r in results if r.get("deferred") == "1")
+
+    # Links go into the in-memory sheet; it is written once at the end of the cycle
+    if sheet is not None:
+        sheet.set_links("Drive URL", {r["no_peserta"]: r["drive_url"] for r in results if r.get("drive_url")})
+
+    try:
+        negative_cache.save()
+    except Exception as e:
+        print(f"Gagal menyimpan cache 404 Pertek: {e}")
 
     print(
-        f"Pertek download complete. Downloaded: {downloaded}, Skipped: {skipped}, Failed: {len(tasks) - downloaded}"
+        f"Pertek download complete. Downloaded: {downloaded}, Skipped: {skipped}, "
+        f"Failed: {len(tasks) - downloaded - deferred}, Deferred: {deferred}"
     )
+    _print_pool_stats("Pertek")
+    return results
 
 
 def download_sk_documents_from_json(
     json_path: str,
     out_dir: str = "data/downloads/monitoring_usulan_ttd_sk",
     localstorage_path: str = "data/sso_localstorage.json",
-    excel_path: str | None = None,
+    sheet: MonitoringSheet | None = None,
     sk_drive_folder_id: str | None = None,
     max_workers: int | None = None,
-) -> None:
+    only_no_peserta: set[str] | None = None,
+    upload_workers: int | None = None,
+    records: MonitoringRecordTable | None = None,
+    tokens: TokenProvider | None = None,
+    budget: CycleBudget | None = None,
+    select: str = "all",
+) -> List[Dict[str, str]]:
     """
     Download SK documents (SK endpoint) for items in monitoring_usulan JSON where
     `no_peserta` is in `selected_no_peserta`. Optionally upload to Drive (sk_drive_folder_id)
-    and update the Excel file's "Drive URL SK" column.
+    and fill the "Drive URL SK" column of `sheet`.
+
+    `only_no_peserta`, status gating, the negative cache, the separate
+    download/upload stages, `records`, `tokens`, `budget` and `select` work
+    as in `download_pertek_documents_from_json`.
+    Returns the per-task results.
     """
     print("Downloading SK documents from JSON...")
-    if not os.path.exists(json_path):
+    if records is None and not os.path.exists(json_path):
         raise FileNotFoundError(f"JSON file not found: {json_path}")
 
-    token = load_sso_token(localstorage_path)
+    if tokens is None:
+        tokens = TokenProvider(localstorage_path)
+    tokens.token()  # fail early when there is no token at all
+    if budget is None:
+        budget = CycleBudget()
 
     base_sk_url = "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/dokumen/sk/"
     headers = {
         "Accept": "application/pdf,application/octet-stream;q=0.9,*/*;q=0.8",
-        "Authorization": f"Bearer {token}",
         "Origin": "https://siasn-instansi.bkn.go.id",
         "Referer": "https://siasn-instansi.bkn.go.id/",
         "User-Agent": (
@@ -817,143 +1255,120 @@ def download_sk_documents_from_json(
 
     os.makedirs(out_dir, exist_ok=True)
 
+    default_workers = env_int("PERTEK_WORKERS", 10, minimum=1)
     if max_workers is None:
-        try:
-            max_workers = int(os.getenv("PERTEK_WORKERS", "10"))
-        except ValueError:
-            max_workers = 10
+        max_workers = env_int("PERTEK_DOWNLOAD_WORKERS", default_workers, minimum=1)
+    if upload_workers is None:
+        upload_workers = env_int("PERTEK_UPLOAD_WORKERS", default_workers, minimum=1)
+
+    allowed_ids = allowed_status_ids("sk")
+    negative_cache = NegativeCache()
 
     # Build tasks
     tasks: List[Dict[str, str]] = []
-    skipped = 0
-    with open(json_path, "r", encoding="utf-8") as f:
-        for it in ijson.items(f, "data.item"):
-            if not isinstance(it, dict):
-                continue
-            item_id = (it.get("id") or "").strip()
-            if not item_id:
-                skipped += 1
-                continue
-            nested = (it or {}).get("usulan_data") or {}
-            nested_data = nested.get("data") or {}
-            no_peserta = (nested_data.get("no_peserta") or "").strip()
-            nip = (it.get("nip") or "").strip()
-            nama = (it.get("nama") or "").strip()
-
-            if not no_peserta or (no_peserta not in selected_no_peserta):
-                skipped += 1
-                continue
-
-            if not nip:
-                nip = item_id
-            sk_fname_base = _sanitize_filename(f"SK_{nip}_{nama}" if nama else f"SK_{nip}")
-            sk_out = os.path.join(out_dir, f"{sk_fname_base}.pdf")
-            tasks.append({"item_id": item_id, "no_peserta": no_peserta, "sk_out": sk_out})
-
-    print(f"Total SK tasks: {len(tasks)} | skipped (filtered): {skipped}")
-
-    def _worker_sk(task: Dict[str, str]) -> Dict[str, str]:
+    rechecks: List[Dict[str, str]] = []
+    unchanged = 0
+    gated = 0
+    cached_missing = 0
+    if records is None:
+        records = load_monitoring_records(json_path)
+    skipped = records.total_items - len(records)
+    for rec in records:
+        item_id = rec.id.strip()
+        if not item_id:
+            skipped += 1
+            continue
+        no_peserta = rec.no_peserta.strip()
+        nip = rec.nip.strip()
+        nama = rec.nama.strip()
+
+        status_id = rec.status_id
+        if allowed_ids is not None and status_id not in allowed_ids:
+            gated += 1
+            continue
+
+        if not nip:
+            nip = item_id
+        sk_fname_base = _sanitize_filename(f"SK_{nip}_{nama}" if nama else f"SK_{nip}")
+        sk_out = os.path.join(out_dir, f"{sk_fname_base}.pdf")
+        recheck = only_no_peserta is not None and no_peserta not in only_no_peserta
+        if recheck and os.path.exists(sk_out):
+            unchanged += 1
+            continue
+        if (select == "pending" and recheck) or (select == "recheck" and not recheck):
+            continue
+        if negative_cache.should_skip("sk", item_id, status_id):
+            cached_missing += 1
+            continue
+        task = {"item_id": item_id, "no_peserta": no_peserta, "status_id": status_id, "sk_out": sk_out}
+        (rechecks if recheck else tasks).append(task)
+    tasks += rechecks
+
+    print(
+        f"Total SK tasks: {len(tasks)} | skipped (filtered): {skipped} | unchanged: {unchanged} "
+        f"| status belum memungkinkan: {gated} | cache 404: {cached_missing}"
+    )
+    CACHE_HITS.inc(unchanged, cache="delta_sk")
+    CACHE_HITS.inc(cached_missing, cache="negative_404_sk")
+
+    def _worker_sk(task: Dict[str, str]) -> tuple[Dict[str, str], str | None]:
         item_id = task["item_id"]
         no_peserta = task["no_peserta"]
         sk_out = task["sk_out"]
         res = {"no_peserta": no_peserta, "saved": "0", "drive_url_sk": ""}
 
-        # download helper
-        url = base_sk_url + item_id
-        req = Request(url, headers=headers, method="GET")
-        body = None
-        last_err = ""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                with urlopen(req, timeout=600) as resp:
-                    status = resp.getcode()
-                    data = resp.read()
-                    if status == 200 and data:
-                        body = data
-                        break
-                    else:
-                        last_err = f"HTTP {status}"
-            except (HTTPError, URLError, IncompleteRead) as e:
-                if isinstance(e, HTTPError):
-                    try:
-                        _ = e.read().decode("utf-8", errors="ignore")  # type: ignore[attr-defined]
-                    except Exception:
-                        pass
-                    last_err = f"{e.code} {e.reason}"
-                elif isinstance(e, IncompleteRead):
-                    last_err = f"Incomplete read: {e}"
-                else:
-                    last_err = f"Network error: {getattr(e, 'reason', str(e))}"
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                else:
-                    last_err = f"{last_err} after {max_retries} attempts"
-
-        if body is None:
-            print(f"Gagal download SK untuk {no_peserta} | {last_err}")
-            return res
+        ok, message, not_found = _download_document(base_sk_url + item_id, headers, tokens, sk_out, "sk", budget)
+        if not ok:
+            print(f"Gagal download SK untuk {no_peserta} | {message}")
+            if not_found:
+                negative_cache.record_miss("sk", item_id, task["status_id"])
+            return res, None
+        negative_cache.clear("sk", item_id)
+        res["saved"] = "1"
+        print(f"Saved SK: {sk_out} ({message})")
 
+        return res, sk_out
+
+    def _upload_worker_sk(res: Dict[str, str], sk_out: str) -> None:
         try:
-            with open(sk_out, "wb") as of:
-                of.write(body)
-            res["saved"] = "1"
-            print(f"Saved SK: {sk_out}")
+            from drive_upload import upload_file_to_drive  # type: ignore
+
+            title_sk = os.path.splitext(os.path.basename(sk_out))[0]
+            drive_url_sk = upload_file_to_drive(
+                sk_out,
+                sk_drive_folder_id,
+                convert_spreadsheet=False,
+                replace_by_title=True,
+                custom_title=title_sk,
+            )
+            res["drive_url_sk"] = drive_url_sk or ""
         except Exception as e:
-            print(f"Failed saving SK {sk_out}: {e}")
-            return res
-
-        if sk_drive_folder_id:
-            try:
-                from drive_upload import upload_file_to_drive  # type: ignore
-
-                title_sk = os.path.splitext(os.path.basename(sk_out))[0]
-                drive_url_sk = upload_file_to_drive(
-                    sk_out,
-                    sk_drive_folder_id,
-                    convert_spreadsheet=False,
-                    replace_by_title=True,
-                    custom_title=title_sk,
-                )
-                res["drive_url_sk"] = drive_url_sk or ""
-            except Exception as e:
-                print(f"Gagal upload SK ke Drive untuk {sk_out}: {e}")
-                res["drive_url_sk"] = ""
+            print(f"Gagal upload SK ke Drive untuk {sk_out}: {e}")
+            res["drive_url_sk"] = ""
+
+    results = _run_document_pipeline(
+        "SK re-check" if select == "recheck" else "SK",
+        tasks,
+        _worker_sk,
+        _upload_worker_sk if sk_drive_folder_id else None,
+        max_workers,
+        upload_workers,
+        budget=budget,
+    )
+    downloaded = sum(1 for r in results if r.get("saved") == "1")
+    deferred = sum(1 for r in results if r.get("deferred") == "1")
 
-        return res
+    if sheet is not None:
+        sheet.set_links("Drive URL SK", {r["no_peserta"]: r["drive_url_sk"] for r in results if r.get("drive_url_sk")})
 
-    downloaded = 0
-    results: List[Dict[str, str]] = []
-    with ThreadPoolExecutor(max_workers=max_workers) as ex:
-        futures = [ex.submit(_worker_sk, t) for t in tasks]
-        for fut in as_completed(futures):
-            try:
-                r = fut.result()
-                results.append(r)
-                if r.get("saved") == "1":
-                    downloaded += 1
-            except Exception as e:
-                print(f"Task SK error: {e}")
-
-    # Update Excel Drive URL SK column
-    if excel_path and load_workbook is not None and os.path.exists(excel_path):
-        try:
-            wb = load_workbook(excel_path)
-            ws = wb.active
-            header_map = {ws.cell(row=1, column=c).value: c for c in range(1, ws.max_column + 1)}
-            col_np = header_map.get("No. Peserta", 1)
-            col_url_sk = header_map.get("Drive URL SK", None)
-            if col_url_sk is None:
-                col_url_sk = ws.max_column + 1
-                ws.cell(row=1, column=col_url_sk, value="Drive URL SK")
-            url_sk_map = {r["no_peserta"]: r.get("drive_url_sk", "") for r in results if r.get("drive_url_sk")}
-            if url_sk_map:
-                for r in range(2, ws.max_row + 1):
-                    np_val = str(ws.cell(row=r, column=col_np).value or "").strip()
-                    if np_val in url_sk_map:
-                        ws.cell(row=r, column=col_url_sk, value=url_sk_map[np_val])
-            wb.save(excel_path)
-        except Exception as e:
-            print(f"Gagal update Excel SK (batch): {e}")
+    try:
+        negative_cache.save()
+    except Exception as e:
+        print(f"Gagal menyimpan cache 404 SK: {e}")
 
-    print(f"SK download complete. Downloaded: {downloaded}, Skipped: {skipped}, Failed: {len(tasks) - downloaded}")
+    print(
+        f"SK download complete. Downloaded: {downloaded}, Skipped: {skipped}, "
+        f"Failed: {len(tasks) - downloaded - deferred}, Deferred: {deferred}"
+    )
+    _print_pool_stats("SK")
+    return results
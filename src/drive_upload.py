@@ -1,12 +1,27 @@
+import hashlib
 import os
 import threading
+import time
 from typing import Optional
 
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
+from metrics import DRIVE_UPLOAD_BYTES, DRIVE_UPLOAD_LATENCY, DRIVE_UPLOADS
+
 
 _GAUTH_LOCK = threading.Lock()
+_CLIENT_LOCK = threading.Lock()
+
+# Process-wide authorized client, built once and shared by all upload threads
+_GAUTH: Optional[GoogleAuth] = None
+_DRIVE: Optional[GoogleDrive] = None
+
+
+def _project_root() -> str:
+    # Resolve project root (one level up from this file's folder)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.dirname(script_dir)
 
 
 def _build_gauth(project_root: str) -> GoogleAuth:
@@ -56,6 +71,159 @@ def _build_gauth(project_root: str) -> GoogleAuth:
         return gauth
 
 
+def get_drive() -> GoogleDrive:
+    """Return the shared authorized ``GoogleDrive`` client.
+
+    Credentials are loaded once per process. When the access token has
+    expired, exactly one caller refreshes it while the others wait and then
+    reuse the refreshed credentials (single-flight). Refreshing here also keeps
+    PyDrive2 from falling back to ``LocalWebserverAuth`` on an expired token.
+    """
+    global _GAUTH, _DRIVE
+    gauth, drive = _GAUTH, _DRIVE
+    if gauth is not None and drive is not None and not gauth.access_token_expired:
+        return drive
+
+    with _CLIENT_LOCK:
+        # Re-check: another thread may have built/refreshed while we waited
+        if _GAUTH is None or _DRIVE is None:
+            _GAUTH = _build_gauth(_project_root())
+            _DRIVE = GoogleDrive(_GAUTH)
+        elif _GAUTH.access_token_expired:
+            with _GAUTH_LOCK:
+                _GAUTH.Refresh()
+                try:
+                    _GAUTH.SaveCredentialsFile(
+                        os.path.join(_project_root(), "config", "drive", "credentials.json")
+                    )
+                except Exception:
+                    pass
+        return _DRIVE
+
+
+# Custom file properties recording the local source of the last upload; converted
+# Google Sheets have no md5Checksum/fileSize of their own.
+_SOURCE_MD5_KEY = "sourceMd5"
+_SOURCE_SIZE_KEY = "sourceSize"
+
+
+def _file_md5(file_path: str) -> str:
+    h = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _entry_from_file(f) -> dict[str, str]:
+    file_id = f.get("id") or ""
+    web_link = f.get("webViewLink") or f.get("alternateLink")
+    if not web_link and file_id:
+        web_link = f"https://drive.google.com/file/d/{file_id}/view"
+    props = {
+        p.get("key"): p.get("value")
+        for p in (f.get("properties") or [])
+        if isinstance(p, dict)
+    }
+    return {
+        "id": str(file_id),
+        "link": str(web_link or ""),
+        "size": str(props.get(_SOURCE_SIZE_KEY) or f.get("fileSize") or ""),
+        "md5": str(props.get(_SOURCE_MD5_KEY) or f.get("md5Checksum") or ""),
+    }
+
+
+class DriveFolderIndex:
+    """Snapshot of one Drive folder: title -> {id, link, size, md5}.
+
+    Loaded with a single listing per cycle (see ``get_folder_index``) and
+    updated by ``upload_file_to_drive`` after each upload. Thread-safe.
+    """
+
+    def __init__(self, folder_id: str, entries: dict[str, dict[str, str]]):
+        self.folder_id = folder_id
+        self._entries = entries
+        self._lock = threading.Lock()
+
+    def get(self, title: str) -> Optional[dict[str, str]]:
+        with self._lock:
+            entry = self._entries.get(title)
+            return dict(entry) if entry else None
+
+    def set(self, title: str, entry: dict[str, str]) -> None:
+        with self._lock:
+            self._entries[title] = dict(entry)
+
+    def links(self) -> dict[str, str]:
+        with self._lock:
+            return {t: e["link"] for t, e in self._entries.items() if e.get("link")}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_UPLOAD_STATS = {"uploaded": 0, "unchanged": 0}
+_UPLOAD_STATS_LOCK = threading.Lock()
+
+
+def _count_upload(kind: str) -> None:
+    with _UPLOAD_STATS_LOCK:
+        _UPLOAD_STATS[kind] += 1
+    DRIVE_UPLOADS.inc(result=kind)
+
+
+def upload_stats() -> dict[str, int]:
+    """Uploads performed vs skipped as unchanged since the last reset."""
+    with _UPLOAD_STATS_LOCK:
+        return dict(_UPLOAD_STATS)
+
+
+_FOLDER_INDEXES: dict[str, DriveFolderIndex] = {}
+_FOLDER_LOCKS: dict[str, threading.Lock] = {}
+_FOLDER_INDEXES_LOCK = threading.Lock()
+
+
+def reset_folder_indexes() -> None:
+    """Forget all folder indexes and upload stats; call once at the start of each cycle."""
+    with _FOLDER_INDEXES_LOCK:
+        _FOLDER_INDEXES.clear()
+    with _UPLOAD_STATS_LOCK:
+        for k in _UPLOAD_STATS:
+            _UPLOAD_STATS[k] = 0
+
+
+def get_folder_index(target_folder_id: str) -> DriveFolderIndex:
+    """Return the index of ``target_folder_id``, listing the folder once per cycle.
+
+    Concurrent callers for the same folder wait for a single listing.
+    Raises if the listing fails so callers can fall back to per-file queries.
+    """
+    with _FOLDER_INDEXES_LOCK:
+        index = _FOLDER_INDEXES.get(target_folder_id)
+        if index is not None:
+            return index
+        lock = _FOLDER_LOCKS.setdefault(target_folder_id, threading.Lock())
+
+    with lock:
+        with _FOLDER_INDEXES_LOCK:
+            index = _FOLDER_INDEXES.get(target_folder_id)
+        if index is not None:
+            return index
+        drive = get_drive()
+        entries: dict[str, dict[str, str]] = {}
+        q = "'{}' in parents and trashed=false".format(target_folder_id)
+        for f in drive.ListFile({"q": q}).GetList():
+            title = f.get("title") or f.get("name")
+            if title and str(title) not in entries:
+                entries[str(title)] = _entry_from_file(f)
+        index = DriveFolderIndex(target_folder_id, entries)
+        with _FOLDER_INDEXES_LOCK:
+            _FOLDER_INDEXES[target_folder_id] = index
+        print(f"Indeks folder Drive {target_folder_id}: {len(index)} file")
+        return index
+
+
 def upload_file_to_drive(
     file_path: str,
     target_folder_id: str,
@@ -63,22 +231,28 @@ def upload_file_to_drive(
     convert_spreadsheet: bool = True,
     replace_by_title: bool = True,
     custom_title: Optional[str] = None,
+    content_md5: Optional[str] = None,
 ) -> str:
     """Upload a single file to Google Drive.
 
-    - If ``replace_by_title`` is True, deletes any existing file in the folder with the same title.
+    - If ``replace_by_title`` is True, replaces the content of the existing file in the folder
+      with the same title. The replace-vs-create decision uses the folder index
+      (one listing per folder per cycle), falling back to a per-file query.
     - If ``convert_spreadsheet`` and the file is Excel/CSV, upload as Google Sheets.
+    - When the existing file has the same MD5 and size as the local file (Drive's
+      ``md5Checksum``/``fileSize`` or the source checksum stored as file properties
+      for converted files), the upload is skipped and the existing link returned.
+      ``content_md5`` overrides the local checksum, e.g. with a hash of the
+      logical content when the file bytes are not reproducible; the size is
+      then not compared.
     - Uses config at ``config/drive/`` for OAuth client and stored credentials.
+    - Safe to call from many threads: the authorized client is shared (see
+      ``get_drive``); PyDrive2 keeps one HTTP object per thread.
     """
     if not os.path.isfile(file_path):
         raise FileNotFoundError(f"File tidak ditemukan: {file_path}")
 
-    # Resolve project root (one level up from this file's folder)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-
-    gauth = _build_gauth(project_root)
-    drive = GoogleDrive(gauth)
+    drive = get_drive()
 
     fname = os.path.basename(file_path)
     title = custom_title or (
@@ -87,9 +261,34 @@ def upload_file_to_drive(
         else fname
     )
 
+    local_size = str(os.path.getsize(file_path))
+    local_md5 = content_md5 or _file_md5(file_path)
+
+    def _unchanged(entry: dict) -> bool:
+        if entry.get("md5") != local_md5:
+            return False
+        return content_md5 is not None or entry.get("size") == local_size
+
     # Look for an existing file with the same title in the target folder
     file_obj = None
+    index: Optional[DriveFolderIndex] = None
     if replace_by_title:
+        try:
+            index = get_folder_index(target_folder_id)
+        except Exception as index_err:
+            print(f"Peringatan: gagal memuat indeks folder Drive: {index_err}")
+    if replace_by_title and index is not None:
+        entry = index.get(title)
+        if entry and _unchanged(entry) and entry.get("link"):
+            print(f"Tidak berubah, upload dilewati: {title} ({entry['id']})")
+            _count_upload("unchanged")
+            return entry["link"]
+        if entry:
+            file_obj = drive.CreateFile({"id": entry["id"], "title": title})
+            print(f"Replace konten file lama: {title} ({entry['id']})")
+        else:
+            print(f"File lama tidak ditemukan, upload baru: {title}")
+    elif replace_by_title:
         try:
             # Build Drive query safely without complex f-string escaping
             safe_title = title.replace("'", "\\'")
@@ -97,6 +296,11 @@ def upload_file_to_drive(
             existing = drive.ListFile({"q": q}).GetList()
             if existing:
                 file_obj = existing[0]
+                entry = _entry_from_file(file_obj)
+                if _unchanged(entry):
+                    print(f"Tidak berubah, upload dilewati: {title} ({entry['id']})")
+                    _count_upload("unchanged")
+                    return entry["link"]
                 print(f"Replace konten file lama: {file_obj.get('title')} ({file_obj.get('id')})")
             else:
                 print(f"File lama tidak ditemukan, upload baru: {title}")
@@ -107,21 +311,32 @@ def upload_file_to_drive(
         metadata = {"title": title, "parents": [{"id": target_folder_id}]}
         file_obj = drive.CreateFile(metadata)
 
+    file_obj["properties"] = [
+        {"key": _SOURCE_MD5_KEY, "value": local_md5, "visibility": "PUBLIC"},
+        {"key": _SOURCE_SIZE_KEY, "value": local_size, "visibility": "PUBLIC"},
+    ]
     file_obj.SetContentFile(file_path)
+    t0 = time.monotonic()
     if convert_spreadsheet and fname.lower().endswith((".xlsx", ".xls", ".csv")):
         file_obj.Upload({"convert": True})
     else:
         file_obj.Upload()
+    DRIVE_UPLOAD_LATENCY.observe(time.monotonic() - t0)
+    DRIVE_UPLOAD_BYTES.inc(int(local_size))
+    _count_upload("uploaded")
 
-    # Fetch metadata to build a share/view link
-    try:
-        file_obj.FetchMetadata(fields='id,alternateLink,webViewLink')
-    except Exception:
-        pass
+    # Fetch metadata to build a share/view link (the upload response usually has it)
+    if not (file_obj.get('webViewLink') or file_obj.get('alternateLink')):
+        try:
+            file_obj.FetchMetadata(fields='id,alternateLink,webViewLink')
+        except Exception:
+            pass
     file_id = file_obj.get('id')
     web_link = file_obj.get('webViewLink') or file_obj.get('alternateLink')
     if not web_link and file_id:
         web_link = f"https://drive.google.com/file/d/{file_id}/view"
+    if index is not None and file_id:
+        index.set(title, _entry_from_file(file_obj))
 
     print(f"Berhasil upload/replace: {title} (ID: {file_id})")
     return web_link or ""
@@ -131,26 +346,12 @@ def list_title_to_link_map(target_folder_id: str) -> dict[str, str]:
     """List all files in a Drive folder and return a map of title -> webViewLink.
 
     Useful to detect previously uploaded Pertek files and reuse their links
-    when regenerating spreadsheets.
+    when regenerating spreadsheets. Backed by the per-cycle folder index, so
+    later uploads to the same folder need no extra listing.
     """
-    # Resolve project root (one level up from this file's folder)
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-
-    gauth = _build_gauth(project_root)
-    drive = GoogleDrive(gauth)
-
     mapping: dict[str, str] = {}
     try:
-        q = "'{}' in parents and trashed=false".format(target_folder_id)
-        for f in drive.ListFile({"q": q}).GetList():
-            title = f.get("title") or f.get("name")
-            file_id = f.get("id")
-            web_link = f.get("webViewLink") or f.get("alternateLink")
-            if not web_link and file_id:
-                web_link = f"https://drive.google.com/file/d/{file_id}/view"
-            if title and web_link:
-                mapping[str(title)] = str(web_link)
+        mapping = get_folder_index(target_folder_id).links()
     except Exception as e:
         print(f"Peringatan: gagal mengambil daftar file Drive: {e}")
     return mapping
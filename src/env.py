@@ -0,0 +1,29 @@
+import os
+
+# Env parsing shared by all modules; no import-time side effects (utils.py
+# configures logging to data/logs/ on import)
+
+
+def env_float(name: str, default: float, minimum: float | None = None) -> float:
+    """Float from env ``name``; ``default`` when unset, empty or not a number.
+    A parsed value below ``minimum`` is raised to it."""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        parsed = float(value)
+    except ValueError:
+        return default
+    return parsed if minimum is None else max(minimum, parsed)
+
+
+def env_int(name: str, default: int, minimum: int | None = None) -> int:
+    """Integer counterpart of ``env_float``."""
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        return default
+    return parsed if minimum is None else max(minimum, parsed)
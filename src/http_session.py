@@ -0,0 +1,295 @@
+import http.client
+import io
+import os
+import socket
+import ssl
+import threading
+import time
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request
+
+from metrics import HTTP_BYTES, HTTP_LATENCY, HTTP_REQUESTS, LIMITER, REGISTRY, endpoint_label
+from rate_limit import AdaptiveLimiter, parse_retry_after
+from env import env_int
+
+
+# Errors that indicate a pooled keep-alive socket was closed by the server while idle
+_STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# Statuses that mean "slow down" to the adaptive limiter
+_OVERLOAD_CODES = (429, 500, 502, 503, 504)
+
+
+class PooledResponse:
+    """Thin wrapper around ``http.client.HTTPResponse`` mimicking ``urlopen``.
+
+    The underlying connection goes back to the pool on ``close()`` when the
+    body has been fully read and the server allows keep-alive; otherwise it is
+    discarded.
+    """
+
+    def __init__(
+        self,
+        session: "HttpSession",
+        key: tuple,
+        conn,
+        resp,
+        url: str,
+        started: float | None = None,
+        endpoint: str = "",
+    ):
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self._started = started
+        self._latency = time.monotonic() - started if started is not None else None
+        self.url = url
+        self.endpoint = endpoint
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+
+    def getcode(self) -> int:
+        return self.status
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        data = self._resp.read(amt) if amt is not None else self._resp.read()
+        HTTP_BYTES.inc(len(data), endpoint=self.endpoint)
+        return data
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        reusable = self._resp.isclosed() and not self._resp.will_close
+        if not reusable:
+            try:
+                self._resp.close()
+            except Exception:
+                pass
+        self._session._release(self._key, conn, reusable)
+        if self._started is not None:
+            started, self._started = self._started, None
+            self._session._limiter_done(
+                started,
+                latency=self._latency,
+                overload=self.status in _OVERLOAD_CODES,
+                retry_after=parse_retry_after(self.headers.get("Retry-After")),
+            )
+
+    def __enter__(self) -> "PooledResponse":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class HttpSession:
+    """Thread-safe keep-alive connection pool, bounded per host.
+
+    ``urlopen`` is a drop-in for ``urllib.request.urlopen`` for the calls made
+    in this project: it accepts a ``Request``, raises ``HTTPError`` for non-2xx
+    responses and ``URLError`` for network failures, and follows redirects.
+    With a ``limiter`` every request holds one of its slots until the
+    response is closed, and reports latency, overload statuses, timeouts and
+    ``Retry-After`` back to it. Connections idle for more than ``max_idle``
+    seconds are dropped instead of reused, since servers close them anyway
+    (typically after 60-75s, e.g. during the gap between two cycles).
+    """
+
+    def __init__(self, max_per_host: int = 10, limiter: AdaptiveLimiter | None = None, max_idle: float = 30.0):
+        self.max_per_host = max(1, int(max_per_host))
+        self.limiter = limiter
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        # key -> [(conn, idle since)], most recently released last
+        self._idle: dict[tuple, list[tuple]] = {}
+        self._slots: dict[tuple, threading.BoundedSemaphore] = {}
+        self._ssl_context = ssl.create_default_context()
+        self.opened = 0
+        self.reused = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            idle = sum(len(v) for v in self._idle.values())
+            return {"opened": self.opened, "reused": self.reused, "idle": idle}
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        self._close([conn for conns in idle.values() for conn, _ in conns])
+
+    @staticmethod
+    def _close(conns: list) -> None:
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _slot(self, key: tuple) -> threading.BoundedSemaphore:
+        with self._lock:
+            sem = self._slots.get(key)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_per_host)
+                self._slots[key] = sem
+            return sem
+
+    def _acquire(self, key: tuple, timeout: float, connect_timeout: float | None = None):
+        """Take a pool slot for ``key`` and return ``(conn, reused)``.
+
+        A new connection uses ``connect_timeout`` (default ``timeout``) only
+        until it is connected; ``_open_once`` then switches it to ``timeout``.
+        """
+        self._slot(key).acquire()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            cutoff = time.monotonic() - self.max_idle
+            expired = [conn for conn, since in idle if since < cutoff]
+            idle[:] = [(conn, since) for conn, since in idle if since >= cutoff]
+            conn = idle.pop()[0] if idle else None
+            if conn is not None:
+                self.reused += 1
+            else:
+                self.opened += 1
+        self._close(expired)
+        if conn is not None:
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        if connect_timeout is None:
+            connect_timeout = timeout
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=connect_timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=connect_timeout)
+        return conn, False
+
+    def _release(self, key: tuple, conn, reusable: bool) -> None:
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(key, []).append((conn, time.monotonic()))
+        else:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._slot(key).release()
+
+    def _limiter_done(self, started: float, **outcome) -> None:
+        if self.limiter is not None:
+            self.limiter.release(started, **outcome)
+
+    def _open_once(self, method: str, url: str, headers: dict, body, timeout) -> PooledResponse:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in ("http", "https"):
+            raise URLError(f"unsupported scheme: {scheme}")
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        endpoint = endpoint_label(url)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+        started = self.limiter.acquire() if self.limiter is not None else None
+        sent = time.monotonic()
+        try:
+            # A reused socket may have been closed by the server: move on to the
+            # next pooled one, and finally to a fresh connection whose failure
+            # is the only one that counts (for the limiter and the caller)
+            while True:
+                conn, reused = self._acquire(key, read_timeout, connect_timeout)
+                try:
+                    if conn.sock is None:
+                        conn.connect()
+                        conn.sock.settimeout(read_timeout)
+                    conn.request(method, path, body=body, headers=headers)
+                    resp = conn.getresponse()
+                except _STALE_ERRORS as e:
+                    self._release(key, conn, False)
+                    if reused:
+                        continue
+                    HTTP_REQUESTS.inc(endpoint=endpoint, code="error")
+                    raise URLError(e)
+                except (OSError, http.client.HTTPException) as e:
+                    self._release(key, conn, False)
+                    HTTP_REQUESTS.inc(endpoint=endpoint, code="error")
+                    if isinstance(e, socket.timeout):
+                        raise URLError(f"timed out: {e}")
+                    raise URLError(e)
+                except BaseException:
+                    self._release(key, conn, False)
+                    raise
+                HTTP_REQUESTS.inc(endpoint=endpoint, code=str(resp.status))
+                HTTP_LATENCY.observe(time.monotonic() - sent, endpoint=endpoint)
+                # The limiter slot now belongs to the response (freed on close)
+                response, started = PooledResponse(self, key, conn, resp, url, started, endpoint), None
+                return response
+        finally:
+            if started is not None:
+                # Network errors and timeouts count as overload
+                self._limiter_done(started, overload=True)
+
+    def urlopen(self, req: Request, timeout: float | tuple[float, float] = 600) -> PooledResponse:
+        """``timeout`` is one value for connect and read, or a ``(connect, read)`` pair."""
+        method = req.get_method()
+        url = req.full_url
+        headers = dict(req.header_items())
+        body = req.data
+        for _ in range(5):
+            resp = self._open_once(method, url, headers, body, timeout)
+            if resp.status in _REDIRECT_CODES and resp.headers.get("Location"):
+                location = urljoin(url, resp.headers["Location"])
+                resp.read()
+                resp.close()
+                url = location
+                if resp.status == 303:
+                    method, body = "GET", None
+                continue
+            if resp.status >= 400:
+                try:
+                    detail = resp.read()
+                finally:
+                    resp.close()
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(detail))
+            return resp
+        raise URLError(f"too many redirects: {req.full_url}")
+
+
+def _limiter_from_env(pool_size: int) -> AdaptiveLimiter | None:
+    """Adaptive limiter for SIASN (env ``SIASN_ADAPTIVE=0`` disables it)."""
+    if os.getenv("SIASN_ADAPTIVE", "1").strip().lower() in ("0", "false", "no"):
+        return None
+    initial = env_int("SIASN_INITIAL_CONCURRENCY", 4)
+    max_limit = env_int("SIASN_MAX_CONCURRENCY", pool_size)
+    return AdaptiveLimiter(initial=initial, max_limit=min(max_limit, pool_size))
+
+
+# Shared session (and concurrency limiter) for every api-siasn.bkn.go.id call
+_SIASN_POOL_SIZE = env_int("SIASN_POOL_SIZE", env_int("PERTEK_WORKERS", 10, minimum=1), minimum=1)
+siasn_limiter = _limiter_from_env(_SIASN_POOL_SIZE)
+siasn_session = HttpSession(max_per_host=_SIASN_POOL_SIZE, limiter=siasn_limiter)
+
+
+def _collect_limiter() -> None:
+    stats = siasn_limiter.stats()
+    LIMITER.set(stats["limit"], state="limit")
+    LIMITER.set(stats["in_flight"], state="in_flight")
+
+
+if siasn_limiter is not None:
+    REGISTRY.on_collect(_collect_limiter)
@@ -0,0 +1,39 @@
+# Run the SSO login once in its own process and exit. `main.run_once` starts
+# this as a short-lived subprocess so Chromium and chromedriver are gone (and
+# their memory freed) before the data stages run. The session is handed over
+# through data/sso_localstorage.json and data/sso_cookies.json; exit code 0
+# means the login succeeded.
+import json
+import sys
+import time
+
+from browser import setup_driver
+from oidc_refresh import capture_refresh_token, save_refresh_token
+from sso_login import login_sso
+
+
+def main() -> int:
+    with open("config/settings.json") as f:
+        config = json.load(f)
+    t0 = time.monotonic()
+    driver = setup_driver(headless=True)
+    print(f"Browser siap dalam {time.monotonic() - t0:.1f}s")
+    try:
+        if login_sso(driver, config):
+            print("Login SSO successful. Current URL:", driver.current_url)
+            # Simpan refresh token agar pembaruan berikutnya tidak perlu browser
+            tokens = capture_refresh_token(driver)
+            if tokens:
+                save_refresh_token(tokens["refresh_token"], tokens.get("refresh_expires_in"))
+                print("Refresh token SSO disimpan")
+            else:
+                print("Refresh token SSO tidak ditemukan; pembaruan berikutnya memakai login browser")
+            return 0
+        print("Login SSO failed.")
+        return 1
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
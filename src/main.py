@@ -1,115 +1,220 @@
-import json
-import os
 import time
 from datetime import datetime
-from browser import setup_driver
-from sso_login import login_sso
+from cycle_budget import CycleBudget
 from download_monitoring_usulan import (
     download_monitoring_usulan_paginated,
     convert_monitoring_json_to_excel,
     download_pertek_documents_from_json,
     download_sk_documents_from_json,
 )
-from drive_upload import upload_file_to_drive
+from drive_upload import reset_folder_indexes, upload_file_to_drive, upload_stats
+from monitoring_delta import compute_monitoring_delta
+from monitoring_records import load_monitoring_records
+from monitoring_store import open_monitoring_store
+from memory_stats import StageMemory
+from metrics import CYCLE_DURATION, CYCLE_LAST_SUCCESS, CYCLES, StageTimer, metrics_from_env, write_textfile
+from oidc_refresh import renew_sso_token
+from scheduler import FixedRateScheduler
+from sso_token import TokenProvider, sso_token_valid, take_login_peaks
+from env import env_float
 
 
-def run_once():
-    # Hapus file sesi lama saat mulai
-    for path in (
-        "data/sso_cookies.json",
-        "data/sso_localstorage.json",
-    ):
-        try:
-            if os.path.exists(path):
-                os.remove(path)
-        except Exception:
-            # Abaikan error penghapusan agar tidak mengganggu startup
-            pass
+def run_once(stages: set[str] | None = None, budget: CycleBudget | None = None):
+    """Satu siklus. ``stages`` dari scheduler: tahap monitoring selalu jalan,
+    tahap dokumen hanya jika ``"documents"`` termasuk (``None`` = semua).
 
-    with open("config/settings.json") as f:
-        config = json.load(f)
+    ``budget`` membatasi tahap dokumen; sheet monitoring selalu ditulis dan
+    diunggah (cadangan ``budget.reserve``). Pekerjaan yang tertunda dilaporkan
+    di akhir siklus dan tetap pending untuk siklus berikutnya.
+    """
+    run_documents = stages is None or "documents" in stages
+    if budget is None:
+        budget = CycleBudget()
+    # Indeks folder Drive dimuat ulang sekali per siklus
+    reset_folder_indexes()
+    memory = StageMemory()
+    timer = StageTimer()
 
-    driver = setup_driver(headless=True)
+    # Penyimpanan SQLite opsional (MONITORING_STORE=sqlite); default file JSON
+    store = open_monitoring_store()
     try:
-        if login_sso(driver, config):
-            print("Login SSO successful. Current URL:", driver.current_url)
+        # Token SSO diperbarui hanya jika sudah/hampir kedaluwarsa: lewat refresh
+        # token (satu request) bila ada, browser hanya jika refresh token habis
+        if sso_token_valid():
+            logged_in = True
+        else:
+            take_login_peaks()
+            logged_in = renew_sso_token()
+            # Hanya jika browser login (subproses) benar-benar dijalankan siklus ini
+            for peak in take_login_peaks():
+                memory.add("login (subproses)", peak)
+        timer.mark("login")
+        if logged_in:
             json_out = "data/downloads/monitoring_usulan.json"
             xlsx_out = "data/downloads/monitoring_usulan.xlsx"
             # Folder Drive untuk Excel (Sheets)
             excel_folder_id = "15_2IHRXVeajrzO0oYaJ_-ARnkDJsW7YY"
             # Folder Drive untuk dokumen PDF Pertek
             pdf_folder_id = "15e0vW-4SJjCjBP8ksIFc1Pw1oUZgJX1F"
-            download_monitoring_usulan_paginated(out_path=json_out)
+            # Folder Drive untuk dokumen PDF SK
+            sk_folder_id = "1YCHZI7-x2aDZI-K4W_bFhns4IbrEn0WC"
+            download_monitoring_usulan_paginated(out_path=json_out, store=store)
+            memory.mark("unduh monitoring")
+            timer.mark("monitoring_download")
+            # Satu kali parsing JSON; tabel record dipakai semua tahap berikutnya
+            records = load_monitoring_records(json_out, store=store)
+            memory.mark("muat record")
+            timer.mark("load_records")
             # Convert JSON to Excel with selected fields
-            convert_monitoring_json_to_excel(
+            # Baris Excel disimpan di memori; link Drive diisi tahap SK/Pertek
+            # lalu workbook ditulis sekali (write-only) sebelum diunggah
+            sheet = convert_monitoring_json_to_excel(
                 json_path=json_out,
                 excel_path=xlsx_out,
                 pertek_drive_folder_id=pdf_folder_id,
+                sk_drive_folder_id=sk_folder_id,
+                records=records,
+                save=False,
             )
+            memory.mark("konversi")
+            timer.mark("convert")
 
-            # Download SK documents to separate folder
-            try:
-                sk_folder_id = "1YCHZI7-x2aDZI-K4W_bFhns4IbrEn0WC"
-                download_sk_documents_from_json(
-                    json_path=json_out,
-                    out_dir="data/downloads/monitoring_usulan_ttd_sk",
-                    excel_path=xlsx_out,
-                    sk_drive_folder_id=sk_folder_id,
-                )
-            except Exception as e:
-                print(f"Gagal download SK: {e}")
+            # Tahap dokumen (SK/Pertek) punya jadwal sendiri; fingerprint delta
+            # hanya disimpan saat tahap ini berjalan sehingga perubahan di antara
+            # dua sapuan tidak terlewat
+            if run_documents:
+                # Bandingkan dengan fingerprint siklus sebelumnya; tahap dokumen
+                # hanya memproses record baru/berubah (atau yang PDF-nya belum ada)
+                delta = compute_monitoring_delta(json_out, records=records)
+                print(delta.summary())
+                pending = delta.pending
+                retry_no_peserta: set[str] = set()
 
-            # Download Pertek documents after conversion
-            try:
-                download_pertek_documents_from_json(
-                    json_path=json_out,
-                    out_dir="data/downloads/monitoring_usulan_ttd_pertek",
-                    excel_path=xlsx_out,
-                    pertek_drive_folder_id=pdf_folder_id,
-                )
-            except Exception as e:
-                print(f"Gagal download Pertek: {e}")
+                # Satu token bersama untuk tahap dokumen; 401 memicu satu kali pembaruan
+                tokens = TokenProvider()
+
+                # Prioritas: dokumen baru/berubah (SK lalu Pertek), setelah itu
+                # re-check PDF yang belum ada; tahap yang tidak sempat dimulai
+                # sebelum anggaran waktu habis ditunda ke siklus berikutnya
+                # (label, fungsi, argumen, kolom link Drive yang harus terisi)
+                document_stages = [
+                    ("SK", download_sk_documents_from_json, {
+                        "out_dir": "data/downloads/monitoring_usulan_ttd_sk",
+                        "sk_drive_folder_id": sk_folder_id,
+                    }, "drive_url_sk" if sk_folder_id else None),
+                    ("Pertek", download_pertek_documents_from_json, {
+                        "out_dir": "data/downloads/monitoring_usulan_ttd_pertek",
+                        "pertek_drive_folder_id": pdf_folder_id,
+                    }, "drive_url" if pdf_folder_id else None),
+                ]
+                for select in ("pending", "recheck"):
+                    for label, download_fn, kwargs, link_key in document_stages:
+                        stage_name = label if select == "pending" else f"{label} re-check"
+                        if budget.expired():
+                            budget.defer(stage_name)
+                            if select == "pending":
+                                retry_no_peserta |= pending
+                            continue
+                        try:
+                            results = download_fn(
+                                json_path=json_out,
+                                sheet=sheet,
+                                only_no_peserta=pending,
+                                records=records,
+                                tokens=tokens,
+                                budget=budget,
+                                select=select,
+                                **kwargs,
+                            )
+                            # Gagal unduh, atau PDF tersimpan tapi upload Drive gagal:
+                            # tanpa retry, PDF di disk membuatnya dilewati selamanya
+                            retry_no_peserta |= {
+                                r["no_peserta"] for r in results
+                                if r.get("saved") != "1" or (link_key and not r.get(link_key))
+                            }
+                        except Exception as e:
+                            print(f"Gagal download {stage_name}: {e}")
+                            retry_no_peserta |= pending
+                        memory.mark(stage_name)
+                        timer.mark(stage_name.lower().replace(" ", "_"))
+
+                # Record yang gagal diproses tetap dianggap berubah pada siklus berikutnya
+                try:
+                    delta.save(retry=retry_no_peserta & pending)
+                except Exception as e:
+                    print(f"Gagal menyimpan fingerprint monitoring: {e}")
+            else:
+                print("Tahap dokumen SK/Pertek tidak dijadwalkan pada tick ini.")
 
             # Upload to Google Drive after conversion
             try:
+                sheet.save(xlsx_out)
                 upload_file_to_drive(
                     xlsx_out,
                     excel_folder_id,
                     convert_spreadsheet=True,
                     replace_by_title=True,
                     custom_title="monitoring_usulan",
+                    content_md5=sheet.content_md5(),
                 )
             except Exception as e:
                 print(f"Gagal upload ke Google Drive: {e}")
+            stats = upload_stats()
+            print(f"Upload Drive siklus ini: diunggah={stats['uploaded']}, tidak berubah={stats['unchanged']}")
+            memory.mark("upload Excel")
+            timer.mark("excel_upload")
+            memory.report()
+            budget.report()
             # Lakukan aksi lain, misalnya navigasi ke dashboard
         else:
             print("Login SSO failed.")
     finally:
-        driver.quit()
+        if store is not None:
+            store.close()
 
 
 if __name__ == "__main__":
-    # Izinkan override interval via environment variable SCHEDULE_MINUTES
-    try:
-        interval_minutes = int(os.getenv("SCHEDULE_MINUTES", "15"))
-    except ValueError:
-        interval_minutes = 15
-    print(f"Scheduler aktif: menjalankan job setiap {interval_minutes} menit.")
-    while True:
-        start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{start_time}] Menjalankan job...")
+    # Tick tetap pada jam dinding (SCHEDULE_MINUTES, default 15); tahap dokumen
+    # SK/Pertek punya jadwal sendiri (DOCUMENT_SCHEDULE_MINUTES, default sama)
+    interval_minutes = env_float("SCHEDULE_MINUTES", 15)
+    document_minutes = env_float("DOCUMENT_SCHEDULE_MINUTES", interval_minutes)
+    scheduler = FixedRateScheduler(
+        period=interval_minutes * 60,
+        cadences={"monitoring": interval_minutes * 60, "documents": document_minutes * 60},
+        jitter=env_float("SCHEDULE_JITTER_SECONDS", 30.0),
+        max_late=env_float("SCHEDULE_MAX_LATE_SECONDS", interval_minutes * 60 / 2),
+    )
+    # Anggaran waktu per siklus (default 90% interval) agar tick berikutnya tidak
+    # terlambat; CYCLE_BUDGET_SECONDS=0 mematikan batas
+    budget_seconds = env_float("CYCLE_BUDGET_SECONDS", interval_minutes * 60 * 0.9) or None
+    budget_reserve = env_float("CYCLE_BUDGET_RESERVE_SECONDS", 60.0)
+    # Endpoint /metrics opsional (METRICS_PORT); textfile ditulis tiap siklus (METRICS_TEXTFILE)
+    metrics_textfile = metrics_from_env()
+
+    def job(stages: set[str]) -> None:
+        # Error diteruskan ke scheduler agar tahap yang gagal diulang pada tick berikutnya
+        cycle_start = time.monotonic()
         try:
-            run_once()
+            run_once(stages, CycleBudget(budget_seconds, reserve=budget_reserve))
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Job selesai.")
-        except KeyboardInterrupt:
-            print("Dihentikan oleh pengguna.")
-            break
-        except Exception as e:
-            print(f"Terjadi error saat menjalankan job: {e}")
-        # Tunggu hingga siklus berikutnya
-        try:
-            for _ in range(interval_minutes * 60):
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("Dihentikan oleh pengguna saat menunggu jadwal berikutnya.")
-            break
+            CYCLES.inc(result="ok")
+            CYCLE_LAST_SUCCESS.set(time.time())
+        except Exception:
+            CYCLES.inc(result="error")
+            raise
+        finally:
+            CYCLE_DURATION.set(time.monotonic() - cycle_start)
+            if metrics_textfile:
+                try:
+                    write_textfile(metrics_textfile)
+                except OSError as e:
+                    print(f"Gagal menulis file metrics: {e}")
+
+    print(
+        f"Scheduler aktif: tick setiap {interval_minutes:g} menit (jitter maks {scheduler.jitter:g}s), "
+        f"dokumen SK/Pertek setiap {scheduler.cadences['documents'] / 60:g} menit."
+    )
+    try:
+        scheduler.run_forever(job)
+    except KeyboardInterrupt:
+        print("Dihentikan oleh pengguna.")
@@ -0,0 +1,76 @@
+import sys
+
+try:
+    import resource
+except ImportError:  # non-POSIX: no getrusage
+    resource = None  # type: ignore[assignment]
+
+
+def _status_kb(field: str) -> int | None:
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def rusage_peak_mb(usage) -> float:
+    """``ru_maxrss`` of a ``getrusage``/``os.wait4`` result in MB."""
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    return usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+
+
+def current_rss_mb() -> float | None:
+    kb = _status_kb("VmRSS")
+    return None if kb is None else kb / 1024
+
+
+def peak_rss_mb() -> float | None:
+    """Peak RSS of this process since start (or since the last ``reset_peak_rss``)."""
+    kb = _status_kb("VmHWM")
+    if kb is not None:
+        return kb / 1024
+    return rusage_peak_mb(resource.getrusage(resource.RUSAGE_SELF)) if resource is not None else None
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS counter (Linux ``clear_refs``); False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageMemory:
+    """Peak RSS per stage of a cycle: call ``mark(name)`` at the end of each stage.
+
+    When the peak cannot be reset the values are cumulative (peak so far).
+    """
+
+    def __init__(self):
+        self.stages: list[tuple[str, float | None]] = []
+        self.resettable = reset_peak_rss()
+
+    def mark(self, name: str) -> float | None:
+        peak = peak_rss_mb()
+        self.stages.append((name, peak))
+        if self.resettable:
+            reset_peak_rss()
+        return peak
+
+    def add(self, name: str, peak_mb: float) -> None:
+        self.stages.append((name, peak_mb))
+
+    def report(self) -> None:
+        if not self.stages:
+            return
+        detail = ", ".join(f"{name}={mb:.0f}MB" if mb is not None else f"{name}=?" for name, mb in self.stages)
+        kind = "per tahap" if self.resettable else "kumulatif"
+        current = current_rss_mb()
+        now = f", saat ini {current:.0f}MB" if current is not None else ""
+        print(f"Puncak RSS ({kind}): {detail}{now}")
@@ -0,0 +1,248 @@
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlsplit
+
+
+_DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+        REGISTRY.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount <= 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = _DEFAULT_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: dict[tuple[str, ...], list[float]] = {}
+        super().__init__(name, help_text, labels)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            # per bucket counts (non-cumulative), then sum and count
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    """All metrics of the process, rendered in the Prometheus text format.
+
+    Collectors registered with ``on_collect`` run before each render, for
+    values that are cheaper to read on demand (e.g. the limiter state).
+    """
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def on_collect(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for fn in collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Collector metrics gagal: {e}")
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter(
+    "siasn_http_requests_total", "HTTP requests to SIASN by endpoint and status code", ("endpoint", "code")
+)
+HTTP_LATENCY = Histogram(
+    "siasn_http_request_duration_seconds", "Time until SIASN response headers", ("endpoint",)
+)
+HTTP_BYTES = Counter("siasn_http_response_bytes_total", "Response body bytes read from SIASN", ("endpoint",))
+RETRIES = Counter("siasn_retries_total", "Retried requests by operation", ("operation",))
+CACHE_HITS = Counter("siasn_cache_hits_total", "Work skipped thanks to a cache", ("cache",))
+TOKEN_REFRESHES = Counter("siasn_sso_token_refreshes_total", "SSO token renewals by method and result", ("method", "result"))
+LIMITER = Gauge("siasn_limiter_concurrency", "Adaptive limiter concurrency (limit and in-flight)", ("state",))
+CIRCUIT_OPEN = Gauge("siasn_circuit_breaker_open", "1 while the circuit breaker of an upstream is open", ("upstream",))
+PIPELINE_ACTIVE = Gauge("siasn_pipeline_active_workers", "Busy workers per document pipeline stage", ("pipeline", "stage"))
+PIPELINE_STEP = Histogram(
+    "siasn_pipeline_task_duration_seconds", "Per-task duration of document pipeline stages", ("pipeline", "stage")
+)
+DOCUMENT_THROUGHPUT = Histogram(
+    "siasn_document_download_mib_per_second",
+    "Throughput of each streamed document download",
+    ("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0),
+)
+DRIVE_UPLOADS = Counter("siasn_drive_uploads_total", "Drive uploads performed or skipped as unchanged", ("result",))
+DRIVE_UPLOAD_BYTES = Counter("siasn_drive_upload_bytes_total", "Bytes uploaded to Google Drive")
+DRIVE_UPLOAD_LATENCY = Histogram("siasn_drive_upload_duration_seconds", "Duration of one Drive upload")
+STAGE_DURATION = Gauge("siasn_stage_duration_seconds", "Duration of each stage in the last cycle", ("stage",))
+CYCLES = Counter("siasn_cycles_total", "Scheduler cycles by result", ("result",))
+CYCLE_DURATION = Gauge("siasn_cycle_duration_seconds", "Duration of the last cycle")
+CYCLE_LAST_SUCCESS = Gauge("siasn_cycle_last_success_timestamp_seconds", "Unix time of the last successful cycle")
+SCHEDULER_TICKS = Counter("siasn_scheduler_ticks_total", "Scheduler ticks by outcome (run, late, skipped, busy)", ("result",))
+DEFERRED_TASKS = Counter("siasn_deferred_tasks_total", "Tasks deferred to the next cycle by the time budget", ("stage",))
+
+
+def endpoint_label(url: str) -> str:
+    """``host/path`` with query dropped and id-like segments collapsed to ``:id``."""
+    parts = urlsplit(url)
+    segments = [":id" if re.search(r"\d", s) else s for s in parts.path.split("/") if s]
+    return f"{parts.hostname or ''}/" + "/".join(segments)
+
+
+class StageTimer:
+    """Duration per stage of a cycle: call ``mark(stage)`` at the end of each stage."""
+
+    def __init__(self):
+        self._last = time.monotonic()
+
+    def mark(self, stage: str) -> float:
+        now = time.monotonic()
+        elapsed, self._last = now - self._last, now
+        STAGE_DURATION.set(elapsed, stage=stage)
+        return elapsed
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread."""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Metrics tersedia di http://{addr}:{server.server_port}/metrics")
+    return server
+
+
+def write_textfile(path: str) -> None:
+    """Write all metrics for node_exporter's textfile collector (atomic replace)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def metrics_from_env() -> str | None:
+    """Start the endpoint when env ``METRICS_PORT`` is set; return ``METRICS_TEXTFILE`` (or None)."""
+    port = os.getenv("METRICS_PORT", "").strip()
+    if port:
+        try:
+            start_metrics_server(int(port), os.getenv("METRICS_ADDR", "127.0.0.1"))
+        except (ValueError, OSError) as e:
+            print(f"Endpoint metrics tidak bisa dijalankan: {e}")
+    return os.getenv("METRICS_TEXTFILE", "").strip() or None
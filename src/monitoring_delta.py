@@ -0,0 +1,90 @@
+import json
+import os
+from typing import Any, Iterable
+
+from monitoring_records import MonitoringRecord, MonitoringRecordTable, load_monitoring_records
+
+
+DEFAULT_STATE_PATH = "data/state/monitoring_fingerprints.json"
+
+
+def record_fingerprint(item: dict[str, Any]) -> str:
+    """Hash of ``status_usulan`` plus every field we extract from a record."""
+    return MonitoringRecord.from_item(item).fingerprint()
+
+
+class MonitoringDelta:
+    """Result of comparing this cycle's records against the persisted fingerprints.
+
+    Keys are ``no_peserta``. ``pending`` (added + changed) is what later stages
+    need to process; call ``save()`` once the cycle has handled them.
+    """
+
+    def __init__(
+        self,
+        state_path: str,
+        fingerprints: dict[str, str],
+        previous: dict[str, str],
+    ):
+        self.state_path = state_path
+        self.fingerprints = fingerprints
+        self.previous = previous
+        current = set(fingerprints)
+        before = set(previous)
+        self.added = current - before
+        self.removed = before - current
+        self.changed = {k for k in current & before if fingerprints[k] != previous[k]}
+        self.unchanged = (current & before) - self.changed
+
+    @property
+    def pending(self) -> set[str]:
+        return self.added | self.changed
+
+    def summary(self) -> str:
+        return (
+            f"Delta monitoring: baru={len(self.added)}, berubah={len(self.changed)}, "
+            f"tetap={len(self.unchanged)}, dihapus={len(self.removed)}"
+        )
+
+    def save(self, retry: Iterable[str] = ()) -> None:
+        """Persist fingerprints; keys in ``retry`` keep their old value so they stay pending."""
+        state = dict(self.fingerprints)
+        for key in retry:
+            if key in self.previous:
+                state[key] = self.previous[key]
+            else:
+                state.pop(key, None)
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+
+def _load_state(state_path: str) -> dict[str, str]:
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def compute_monitoring_delta(
+    json_path: str,
+    state_path: str = DEFAULT_STATE_PATH,
+    selected: set[str] | None = None,
+    records: MonitoringRecordTable | None = None,
+) -> MonitoringDelta:
+    """Diff selected records against the last cycle.
+
+    Uses the shared record table when given, otherwise parses ``json_path``.
+    """
+    if records is None:
+        records = load_monitoring_records(json_path, selected)
+    fingerprints: dict[str, str] = {}
+    for rec in records:
+        no_peserta = rec.no_peserta.strip()
+        if no_peserta and no_peserta not in fingerprints:
+            fingerprints[no_peserta] = rec.fingerprint()
+    return MonitoringDelta(state_path, fingerprints, _load_state(state_path))
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+from typing import Any, Iterable, Iterator
+
+import ijson
+
+from monitoring_store import MonitoringStore
+from selected_no_peserta import selected_no_peserta
+
+
+def _s(value: Any) -> str:
+    if not value:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+class MonitoringRecord:
+    """Compact view of one monitoring item holding only the fields we use.
+
+    Values are kept raw (not stripped) so each stage can apply the same
+    normalisation it always did.
+    """
+
+    __slots__ = (
+        "id",
+        "nip",
+        "nama",
+        "status_id",
+        "no_peserta",
+        "nested_nama",
+        "unor_nama",
+        "glr_depan",
+        "glr_belakang",
+        "tgl_kontrak_mulai",
+        "tgl_kontrak_akhir",
+        "tk_pendidikan_id",
+        "pendidikan_pertama_nama",
+    )
+
+    def __init__(self, **fields: str):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name, ""))
+
+    @classmethod
+    def from_item(cls, item: dict[str, Any]) -> "MonitoringRecord":
+        nested = item.get("usulan_data") or {}
+        nested_data = (nested.get("data") or {}) if isinstance(nested, dict) else {}
+        if not isinstance(nested_data, dict):
+            nested_data = {}
+        return cls(
+            id=_s(item.get("id")),
+            nip=_s(item.get("nip")),
+            nama=_s(item.get("nama")),
+            status_id=_s(item.get("status_usulan")),
+            no_peserta=_s(nested_data.get("no_peserta")),
+            nested_nama=_s(nested_data.get("nama")),
+            unor_nama=_s(nested_data.get("unor_nama")),
+            glr_depan=_s(nested_data.get("glr_depan")),
+            glr_belakang=_s(nested_data.get("glr_belakang")),
+            tgl_kontrak_mulai=_s(nested_data.get("tgl_kontrak_mulai")),
+            tgl_kontrak_akhir=_s(nested_data.get("tgl_kontrak_akhir")),
+            tk_pendidikan_id=_s(nested_data.get("tk_pendidikan_id")),
+            pendidikan_pertama_nama=_s(nested_data.get("pendidikan_pertama_nama")),
+        )
+
+    def fingerprint(self) -> str:
+        """Hash of ``status_usulan`` plus every extracted field (see ``monitoring_delta``)."""
+        payload = [
+            self.id,
+            self.status_id,
+            self.nip,
+            self.nama,
+            self.no_peserta,
+            self.nested_nama,
+            self.unor_nama,
+            self.glr_depan,
+            self.glr_belakang,
+            self.tgl_kontrak_mulai,
+            self.tgl_kontrak_akhir,
+            self.tk_pendidikan_id,
+            self.pendidikan_pertama_nama,
+        ]
+        return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class MonitoringRecordTable:
+    """Selected records of ``monitoring_usulan.json`` in file order, built in one pass.
+
+    ``ids`` / ``no_peserta_all`` cover every item in the file (not only the
+    selected ones) so new items can be deduplicated without re-reading it.
+    When backed by a ``MonitoringStore`` only the selected rows are loaded
+    and deduplication is answered by the store's indexes instead.
+    """
+
+    def __init__(self, json_path: str, selected: set[str], store: MonitoringStore | None = None):
+        self.json_path = json_path
+        self.selected = selected
+        self.store = store
+        self.records: list[MonitoringRecord] = []
+        self.ids: set[str] = set()
+        self.no_peserta_all: set[str] = set()
+        self.total_items = 0
+
+    def __iter__(self) -> Iterator[MonitoringRecord]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add_item(self, item: Any) -> MonitoringRecord | None:
+        if not isinstance(item, dict):
+            return None
+        self.total_items += 1
+        rec = MonitoringRecord.from_item(item)
+        if rec.id.strip():
+            self.ids.add(rec.id.strip())
+        np_value = rec.no_peserta.strip()
+        if np_value:
+            self.no_peserta_all.add(np_value)
+        if np_value and np_value in self.selected:
+            self.records.append(rec)
+            return rec
+        return None
+
+    def is_known(self, item_id: str, no_peserta: str) -> bool:
+        """True when an item with this ``id`` or ``no_peserta`` is already stored."""
+        if self.store is not None:
+            return self.store.has(item_id, no_peserta)
+        return bool((item_id and item_id in self.ids) or (no_peserta and no_peserta in self.no_peserta_all))
+
+
+def load_monitoring_records(
+    json_path: str,
+    selected: set[str] | None = None,
+    store: MonitoringStore | None = None,
+) -> MonitoringRecordTable:
+    """Parse ``monitoring_usulan.json`` once and keep only what the stages need.
+
+    With ``store`` the selected rows are read from SQLite by ``no_peserta``
+    and ``json_path`` is not touched.
+    """
+    if selected is None:
+        selected = selected_no_peserta
+    if store is not None:
+        table = MonitoringRecordTable(json_path, selected, store=store)
+        for it in store.iter_items(selected):
+            table.add_item(it)
+        table.total_items = store.count()
+        print(f"Record monitoring dimuat (SQLite): {len(table)} terpilih dari {table.total_items} item")
+        return table
+    if not os.path.exists(json_path):
+        raise FileNotFoundError(f"JSON file not found: {json_path}")
+    table = MonitoringRecordTable(json_path, selected)
+    with open(json_path, "r", encoding="utf-8") as f:
+        for it in ijson.items(f, "data.item"):
+            table.add_item(it)
+    print(f"Record monitoring dimuat: {len(table)} terpilih dari {table.total_items} item")
+    return table
+
+
+def append_items_to_monitoring_json(json_path: str, items: Iterable[dict]) -> int:
+    """Append items to the ``{"data":[...]}`` file without parsing it.
+
+    The file must end with ``]}`` (as written by the paginated download).
+    Its bytes up to the closing ``]`` are copied as is into ``<path>.tmp``,
+    followed by the new items, and the copy replaces the file atomically,
+    so a crash or full disk never leaves a truncated JSON behind.
+    """
+    chunks = [json.dumps(it, ensure_ascii=False) for it in items]
+    if not chunks:
+        return 0
+    tmp_path = json_path + ".tmp"
+    with open(json_path, "rb") as src:
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        tail_len = min(size, 64)
+        src.seek(size - tail_len)
+        tail = src.read(tail_len)
+        stripped = tail.rstrip()
+        if not stripped.endswith(b"]}"):
+            raise ValueError(f"Unexpected JSON tail in {json_path}")
+        close_pos = size - tail_len + len(stripped) - 2  # position of "]"
+        before = stripped[:-2].rstrip()
+        is_empty = before.endswith(b"[")
+        payload = ("" if is_empty else ",") + ",".join(chunks) + "]}"
+        src.seek(0)
+        try:
+            with open(tmp_path, "wb") as dst:
+                left = close_pos
+                while left > 0:
+                    block = src.read(min(left, 1024 * 1024))
+                    if not block:
+                        raise ValueError(f"{json_path} changed while appending")
+                    dst.write(block)
+                    left -= len(block)
+                dst.write(payload.encode("utf-8"))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    os.replace(tmp_path, json_path)
+    return len(chunks)
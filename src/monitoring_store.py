@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+from typing import Any, Iterable, Iterator
+
+
+DEFAULT_DB_PATH = "data/downloads/monitoring_usulan.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL DEFAULT '',
+    no_peserta TEXT NOT NULL DEFAULT '',
+    raw TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_items_id ON items(id) WHERE id <> '';
+CREATE INDEX IF NOT EXISTS idx_items_no_peserta ON items(no_peserta);
+"""
+
+
+def _s(value: Any) -> str:
+    if not value:
+        return ""
+    return (value if isinstance(value, str) else str(value)).strip()
+
+
+def _keys(item: dict[str, Any]) -> tuple[str, str]:
+    """``(id, no_peserta)`` of an item, stripped; empty string when absent."""
+    nested = item.get("usulan_data") or {}
+    nested_data = (nested.get("data") or {}) if isinstance(nested, dict) else {}
+    if not isinstance(nested_data, dict):
+        nested_data = {}
+    return _s(item.get("id")), _s(nested_data.get("no_peserta"))
+
+
+class MonitoringStore:
+    """SQLite storage for monitoring items, indexed by ``id`` and ``no_peserta``.
+
+    Items are kept as raw JSON text in download order; ``id`` is unique (when
+    present) so re-inserting an item updates it in place. Use from a single
+    thread.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def begin_replace(self) -> None:
+        """Start a full refresh; the old data stays visible to readers until ``commit``."""
+        self.conn.execute("BEGIN")
+        self.conn.execute("DELETE FROM items")
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def insert_many(self, items: Iterable[dict[str, Any]]) -> int:
+        """Bulk insert; items whose ``id`` already exists are updated instead."""
+        rows = []
+        for it in items:
+            if not isinstance(it, dict):
+                continue
+            idv, npv = _keys(it)
+            rows.append((idv, npv, json.dumps(it, ensure_ascii=False)))
+        self.conn.executemany(
+            "INSERT INTO items (id, no_peserta, raw) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) WHERE id <> '' DO UPDATE SET no_peserta=excluded.no_peserta, raw=excluded.raw",
+            rows,
+        )
+        return len(rows)
+
+    def has(self, item_id: str = "", no_peserta: str = "") -> bool:
+        if item_id and self.conn.execute("SELECT 1 FROM items WHERE id=?", (item_id,)).fetchone():
+            return True
+        if no_peserta and self.conn.execute(
+            "SELECT 1 FROM items WHERE no_peserta=?", (no_peserta,)
+        ).fetchone():
+            return True
+        return False
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def iter_items(self, no_peserta: Iterable[str] | None = None) -> Iterator[dict[str, Any]]:
+        """Yield items in download order, optionally only for the given ``no_peserta``."""
+        if no_peserta is None:
+            cur = self.conn.execute("SELECT raw FROM items ORDER BY seq")
+        else:
+            in_transaction = self.conn.in_transaction
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (np TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM wanted")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO wanted (np) VALUES (?)", ((n,) for n in no_peserta)
+            )
+            # Filling the temp table opens an implicit transaction; close it so a
+            # later begin_replace() can start its own
+            if not in_transaction:
+                self.conn.commit()
+            cur = self.conn.execute(
+                "SELECT raw FROM items WHERE no_peserta IN (SELECT np FROM wanted) ORDER BY seq"
+            )
+        for (raw,) in cur:
+            yield json.loads(raw)
+
+    def export_json(self, json_path: str) -> int:
+        """Write all items as ``{"data":[...]}`` (the format of the paginated download)."""
+        os.makedirs(os.path.dirname(json_path) or ".", exist_ok=True)
+        tmp_path = json_path + ".tmp"
+        n = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write('{"data":[')
+            for (raw,) in self.conn.execute("SELECT raw FROM items ORDER BY seq"):
+                if n:
+                    f.write(",")
+                f.write(raw)
+                n += 1
+            f.write("]}")
+        os.replace(tmp_path, json_path)
+        return n
+
+
+def open_monitoring_store(db_path: str = DEFAULT_DB_PATH) -> MonitoringStore | None:
+    """Return the SQLite store when ``MONITORING_STORE=sqlite``, else ``None`` (JSON file)."""
+    if os.getenv("MONITORING_STORE", "json").strip().lower() != "sqlite":
+        return None
+    return MonitoringStore(db_path)
@@ -0,0 +1,197 @@
+import http.client
+import json
+import os
+import time
+from typing import Any
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from metrics import TOKEN_REFRESHES
+from sso_token import DEFAULT_LOCALSTORAGE_PATH, jwt_claims, jwt_expiry, run_login_subprocess
+
+
+DEFAULT_OIDC_STATE_PATH = "data/state/sso_oidc.json"
+
+# Renew while the refresh token still has at least this many seconds left
+_REFRESH_MARGIN_SECONDS = 30
+
+
+def token_endpoint(settings_path: str = "config/settings.json") -> tuple[str, str]:
+    """``(token_endpoint, client_id)`` of the Keycloak realm used by ``login_sso``.
+
+    Derived from ``sso_url`` in the settings (``.../protocol/openid-connect/auth``
+    -> ``.../token``, ``client_id`` query parameter). Env ``SSO_TOKEN_ENDPOINT``
+    and ``SSO_CLIENT_ID`` override them, e.g. to point at a local stand-in.
+    """
+    endpoint = os.getenv("SSO_TOKEN_ENDPOINT", "").strip()
+    client_id = os.getenv("SSO_CLIENT_ID", "").strip()
+    if endpoint and client_id:
+        return endpoint, client_id
+    try:
+        with open(settings_path, "r", encoding="utf-8") as f:
+            sso_url = json.load(f).get("sso_url", "")
+    except (OSError, ValueError):
+        sso_url = ""
+    parts = urlsplit(sso_url)
+    if not endpoint and parts.path.endswith("/auth"):
+        endpoint = f"{parts.scheme}://{parts.netloc}{parts.path[: -len('/auth')]}/token"
+    if not client_id:
+        client_id = (parse_qs(parts.query).get("client_id") or [""])[0]
+    return endpoint, client_id
+
+
+def _load_state(path: str) -> dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_json_atomic(path: str, data: dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def save_refresh_token(
+    refresh_token: str,
+    refresh_expires_in: float | None = None,
+    path: str = DEFAULT_OIDC_STATE_PATH,
+) -> None:
+    """Persist the refresh token; expiry from ``refresh_expires_in`` or its JWT ``exp``."""
+    expires_at = None
+    if refresh_expires_in:
+        expires_at = time.time() + float(refresh_expires_in)
+    else:
+        expires_at = jwt_expiry(refresh_token)
+    if expires_at is not None and expires_at <= 0:
+        expires_at = None  # offline tokens carry exp=0 (no expiry)
+    _write_json_atomic(path, {"refresh_token": refresh_token, "refresh_expires_at": expires_at})
+
+
+def capture_refresh_token(driver) -> dict[str, Any] | None:
+    """Find the refresh token obtained by the portal during the browser login.
+
+    Looks at the realm token endpoint responses in Chrome's performance log
+    first, then at any localStorage/sessionStorage value that is a Keycloak
+    refresh JWT (``typ`` Refresh/Offline).
+    """
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        entries = []
+    for entry in reversed(entries):
+        try:
+            msg = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if msg.get("method") != "Network.responseReceived":
+            continue
+        params = msg.get("params") or {}
+        url = (params.get("response") or {}).get("url", "")
+        if "/protocol/openid-connect/token" not in url:
+            continue
+        try:
+            body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+            data = json.loads(body.get("body") or "{}")
+        except Exception:
+            continue
+        if isinstance(data, dict) and data.get("refresh_token"):
+            return data
+
+    try:
+        storage = driver.execute_script(
+            """
+            var items = {};
+            [window.localStorage, window.sessionStorage].forEach(function (s) {
+                for (var i = 0; i < s.length; i++) {
+                    var k = s.key(i);
+                    items[k] = s.getItem(k);
+                }
+            });
+            return items;
+            """
+        ) or {}
+    except Exception:
+        storage = {}
+    for value in storage.values():
+        if not isinstance(value, str) or value.count(".") != 2:
+            continue
+        claims = jwt_claims(value)
+        if claims and claims.get("typ") in ("Refresh", "Offline"):
+            return {"refresh_token": value}
+    return None
+
+
+def refresh_sso_token(
+    localstorage_path: str = DEFAULT_LOCALSTORAGE_PATH,
+    state_path: str = DEFAULT_OIDC_STATE_PATH,
+    timeout: float = 30,
+) -> bool:
+    """Exchange the saved refresh token for a new ``sso_token`` (one HTTP request).
+
+    Returns False when there is no usable refresh token or the realm rejects
+    it; the caller then falls back to the browser login.
+    """
+    state = _load_state(state_path)
+    refresh_token = state.get("refresh_token")
+    if not refresh_token:
+        return False
+    expires_at = state.get("refresh_expires_at")
+    if expires_at and expires_at - time.time() < _REFRESH_MARGIN_SECONDS:
+        print("Refresh token SSO sudah kedaluwarsa")
+        return False
+    endpoint, client_id = token_endpoint()
+    if not endpoint or not client_id:
+        print("Endpoint token SSO tidak diketahui; set SSO_TOKEN_ENDPOINT dan SSO_CLIENT_ID")
+        return False
+
+    form = {"grant_type": "refresh_token", "client_id": client_id, "refresh_token": refresh_token}
+    req = Request(
+        endpoint,
+        data=urlencode(form).encode("ascii"),
+        headers={"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
+        method="POST",
+    )
+    t0 = time.monotonic()
+    try:
+        with urlopen(req, timeout=timeout) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+    except HTTPError as e:
+        print(f"Refresh token SSO ditolak: {e.code} {e.reason}")
+        if e.code in (400, 401):
+            # invalid_grant: sesi SSO sudah berakhir, jangan dicoba lagi
+            _write_json_atomic(state_path, {})
+        return False
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        # URLError, timeouts, resets and incomplete reads: fall back to the browser login
+        print(f"Gagal memperbarui token via refresh token: {e}")
+        return False
+
+    access_token = data.get("access_token") if isinstance(data, dict) else None
+    if not access_token:
+        print("Respon endpoint token tanpa access_token")
+        return False
+    storage = _load_state(localstorage_path)
+    storage["sso_token"] = access_token
+    _write_json_atomic(localstorage_path, storage)
+    # Keycloak may rotate the refresh token
+    if data.get("refresh_token"):
+        save_refresh_token(data["refresh_token"], data.get("refresh_expires_in"), state_path)
+    print(f"Token SSO diperbarui via refresh token dalam {(time.monotonic() - t0) * 1000:.0f}ms")
+    return True
+
+
+def renew_sso_token(localstorage_path: str = DEFAULT_LOCALSTORAGE_PATH) -> bool:
+    """Refresh-token exchange first; the browser login only when that is not possible."""
+    if refresh_sso_token(localstorage_path):
+        TOKEN_REFRESHES.inc(method="refresh_token", result="ok")
+        return True
+    ok = run_login_subprocess()
+    TOKEN_REFRESHES.inc(method="browser", result="ok" if ok else "failed")
+    return ok
@@ -0,0 +1,144 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting calls to ``rate`` per second.
+
+    ``acquire()`` blocks until a token is available. Up to ``burst`` tokens
+    (default: one second's worth) can be spent at once. ``rate <= 0``
+    disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.capacity = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit shared by every call to one upstream.
+
+    The limit grows by about one slot per round of healthy responses and is
+    cut by ``backoff`` on 429/5xx/timeouts (at most once per observed
+    latency, so a burst of failures counts as one signal). Responses slower
+    than ``latency_tolerance`` times the best recent latency stop the growth.
+    A ``Retry-After`` pauses new calls until it expires.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self._in_flight = 0
+        self._latency: float | None = None  # EWMA, seconds
+        self._best_latency: float | None = None
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self.successes = 0
+        self.overloads = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> float:
+        """Wait for a slot; returns the start time to pass to ``release``."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    self._cond.wait(self._paused_until - now)
+                    continue
+                if self._in_flight < int(self._limit):
+                    self._in_flight += 1
+                    return now
+                self._cond.wait(1.0)
+
+    def release(
+        self,
+        start: float,
+        latency: float | None = None,
+        overload: bool = False,
+        retry_after: float | None = None,
+    ) -> None:
+        """Return a slot. ``latency`` defaults to the time since ``start``."""
+        now = time.monotonic()
+        if latency is None:
+            latency = now - start
+        with self._cond:
+            self._in_flight -= 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if overload:
+                self.overloads += 1
+                # One decrease per latency window: requests already in flight
+                # when the upstream started failing should not compound it
+                if now - self._last_decrease > (self._latency or latency):
+                    self._limit = max(float(self.min_limit), self._limit * self.backoff)
+                    self._last_decrease = now
+            else:
+                self.successes += 1
+                self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+                if self._best_latency is None or latency < self._best_latency:
+                    self._best_latency = latency
+                else:
+                    # Let the baseline drift up slowly so one lucky sample does not pin it
+                    self._best_latency += (latency - self._best_latency) * 0.01
+                if self._latency <= self._best_latency * self.latency_tolerance:
+                    self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "latency_ms": round((self._latency or 0.0) * 1000, 1),
+                "best_latency_ms": round((self._best_latency or 0.0) * 1000, 1),
+                "successes": self.successes,
+                "overloads": self.overloads,
+            }
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,218 @@
+import http.client
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+from urllib.error import HTTPError, URLError
+
+from cycle_budget import CycleBudget
+from metrics import CIRCUIT_OPEN, RETRIES
+from rate_limit import parse_retry_after
+from env import env_float, env_int
+
+
+T = TypeVar("T")
+
+# Statuses worth another attempt; every other 4xx is final (404 = not there yet)
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class RetryableError(Exception):
+    """A bad answer (e.g. an empty body) that deserves another attempt but says
+    nothing about upstream health."""
+
+
+class CircuitOpenError(URLError):
+    """Raised without a request while the upstream's circuit breaker is open."""
+
+
+# What a failed ``RetryPolicy.call`` can raise for a request (HTTPError/URLError are OSErrors)
+REQUEST_ERRORS = (OSError, http.client.HTTPException, RetryableError)
+
+
+def describe_error(e: BaseException) -> str:
+    if isinstance(e, HTTPError):
+        return f"{e.code} {e.reason}"
+    if isinstance(e, http.client.IncompleteRead):
+        return f"Incomplete read: {e}"
+    if isinstance(e, URLError):
+        return f"Network error: {e.reason}"
+    return str(e)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one upstream.
+
+    After ``threshold`` network errors/timeouts/5xx in a row the circuit
+    opens and calls fail at once for ``cooldown`` seconds. Then a single
+    trial request is let through (half-open): success closes the circuit,
+    failure opens it for another cooldown.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                print(f"Circuit breaker {self.name} tertutup kembali (upstream merespons)")
+                CIRCUIT_OPEN.set(0, upstream=self.name)
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """End a trial request that said nothing about upstream health (e.g. a
+        local write error): the circuit stays as it is and may probe again."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                self._probing = False
+                self._opened_at = time.monotonic()
+            elif self._opened_at is None and self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                CIRCUIT_OPEN.set(1, upstream=self.name)
+                print(
+                    f"Circuit breaker {self.name} terbuka setelah {self._failures} kegagalan berturut-turut; "
+                    f"request ditolak selama {self.cooldown:.0f}s"
+                )
+
+
+class RetryPolicy:
+    """One place for timeouts, retries and backoff of calls to an upstream.
+
+    ``call(fn, operation)`` runs ``fn(timeout)``, where ``timeout`` is the
+    ``(connect, read)`` pair for ``HttpSession.urlopen``, and retries it up
+    to ``max_attempts`` times on network errors, timeouts, incomplete reads,
+    ``RetryableError`` and ``RETRY_STATUSES``. Other HTTP errors (401, 404,
+    ...) are raised at once. The delay is exponential backoff with full
+    jitter, but never shorter than the server's ``Retry-After``; a
+    ``Retry-After`` beyond ``max_delay`` ends the retries. With a
+    ``breaker`` a dead upstream fails every call immediately. With a
+    ``budget`` (``CycleBudget``) the read timeout is capped by the time left
+    and no retry sleeps past it.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 120.0,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.breaker = breaker
+
+    def timeout(self, budget: CycleBudget | None = None) -> tuple[float, float]:
+        read = self.read_timeout if budget is None else budget.timeout(self.read_timeout)
+        return min(self.connect_timeout, read), read
+
+    @staticmethod
+    def classify(e: BaseException) -> tuple[bool, bool]:
+        """``(retryable, upstream_failure)`` for an exception raised by one attempt."""
+        if isinstance(e, CircuitOpenError):
+            return False, False
+        if isinstance(e, HTTPError):
+            return e.code in RETRY_STATUSES, e.code >= 500
+        if isinstance(e, RetryableError):
+            return True, False
+        if isinstance(e, (URLError, http.client.HTTPException, OSError)):
+            return True, True
+        return False, False
+
+    def backoff(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """Delay before attempt ``attempt + 1``; ``None`` when ``Retry-After`` is too long."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, fn: Callable[[tuple[float, float]], T], operation: str, budget: CycleBudget | None = None) -> T:
+        attempt = 0
+        while True:
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpenError(f"circuit breaker {self.breaker.name} terbuka")
+            try:
+                result = fn(self.timeout(budget))
+            except Exception as e:
+                retryable, upstream_failure = self.classify(e)
+                if self.breaker is not None:
+                    if upstream_failure:
+                        self.breaker.record_failure()
+                    elif isinstance(e, HTTPError):
+                        # A real (4xx) answer: the upstream is up
+                        self.breaker.record_success()
+                    else:
+                        self.breaker.release_probe()
+                attempt += 1
+                if not retryable or attempt >= self.max_attempts:
+                    raise
+                retry_after = None
+                if isinstance(e, HTTPError) and e.headers is not None:
+                    retry_after = parse_retry_after(e.headers.get("Retry-After"))
+                delay = self.backoff(attempt, retry_after)
+                if delay is None or (budget is not None and budget.remaining() < delay):
+                    raise
+                if self.breaker is not None and self.breaker.is_open:
+                    raise
+                print(f"Attempt {attempt} failed ({operation}): {describe_error(e)}. Retrying in {delay:.1f} seconds...")
+                RETRIES.inc(operation=operation)
+                time.sleep(delay)
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+
+def _policy_from_env() -> RetryPolicy:
+    breaker = CircuitBreaker(
+        "SIASN",
+        threshold=env_int("SIASN_BREAKER_THRESHOLD", 5),
+        cooldown=env_float("SIASN_BREAKER_COOLDOWN_SECONDS", 30.0),
+    )
+    return RetryPolicy(
+        max_attempts=env_int("SIASN_RETRY_ATTEMPTS", 3),
+        base_delay=env_float("SIASN_RETRY_BASE_DELAY", 1.0),
+        max_delay=env_float("SIASN_RETRY_MAX_DELAY", 30.0),
+        connect_timeout=env_float("SIASN_CONNECT_TIMEOUT", 10.0),
+        read_timeout=env_float("SIASN_READ_TIMEOUT", 120.0),
+        breaker=breaker,
+    )
+
+
+# Shared policy (and circuit breaker) for every api-siasn.bkn.go.id call
+siasn_retry = _policy_from_env()
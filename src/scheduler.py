@@ -0,0 +1,145 @@
+import math
+import os
+import random
+import time
+from datetime import datetime
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process lock
+    fcntl = None  # type: ignore[assignment]
+
+from metrics import SCHEDULER_TICKS
+
+
+DEFAULT_LOCK_PATH = "data/state/scheduler.lock"
+
+
+def _fmt(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class _RunLock:
+    """Non-blocking exclusive lock file, so a cron run and the loop never overlap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: int | None = None
+
+    def acquire(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class FixedRateScheduler:
+    """Run ``job(stages)`` on a fixed wall-clock grid without overlapping runs.
+
+    Ticks fall on multiples of ``period`` seconds (e.g. :00, :15, :30, :45
+    for 15 minutes), each delayed by a random ``0..jitter`` seconds. The
+    first run starts right away. ``cadences`` maps a stage name to its own
+    period; a stage is passed to ``job`` once per slot of that period (its
+    first tick after the slot starts), so an hourly stage also runs when the
+    exact :00 tick was missed.
+
+    A run that lasts past the next tick never overlaps it: when it ends at
+    most ``max_late`` seconds (default half a period) after the latest
+    missed tick, that tick starts late; older missed ticks are skipped. Both
+    are reported. Runs in other processes (e.g. a cron entry) are excluded
+    through ``lock_path``; a tick that finds the lock held is skipped.
+    """
+
+    def __init__(
+        self,
+        period: float,
+        cadences: dict[str, float],
+        jitter: float = 0.0,
+        max_late: float | None = None,
+        lock_path: str = DEFAULT_LOCK_PATH,
+    ):
+        self.period = max(1.0, float(period))
+        self.cadences = {name: max(self.period, float(c)) for name, c in cadences.items()}
+        self.jitter = max(0.0, float(jitter))
+        self.max_late = self.period / 2 if max_late is None else max(0.0, float(max_late))
+        self._lock = _RunLock(lock_path)
+        self._last_slot: dict[str, int] = {}
+
+    def next_tick(self, after: float) -> float:
+        return (math.floor(after / self.period) + 1) * self.period
+
+    def due_stages(self, tick: float) -> set[str]:
+        return {
+            name for name, cadence in self.cadences.items()
+            if self._last_slot.get(name) != math.floor(tick / cadence)
+        }
+
+    def _sleep_until(self, target: float) -> None:
+        # Short naps against the wall clock, so clock adjustments do not add drift
+        while True:
+            left = target - time.time()
+            if left <= 0:
+                return
+            time.sleep(min(left, 30.0))
+
+    def _run_tick(self, job: Callable[[set[str]], None], tick: float, delay: float) -> None:
+        started = time.time()
+        late = started - tick - delay
+        if late > 1.0:
+            print(f"Scheduler: tick {_fmt(tick)} terlambat {late:.0f}s (siklus sebelumnya melewati jadwal)")
+            SCHEDULER_TICKS.inc(result="late")
+        if not self._lock.acquire():
+            print(f"Scheduler: tick {_fmt(tick)} dilewati, siklus lain masih berjalan ({self._lock.path})")
+            SCHEDULER_TICKS.inc(result="busy")
+            return
+        stages = self.due_stages(tick)
+        try:
+            print(f"[{_fmt(started)}] Menjalankan job (tick {_fmt(tick)}, tahap: {', '.join(sorted(stages))})...")
+            job(stages)
+            for name in stages:
+                self._last_slot[name] = math.floor(tick / self.cadences[name])
+            SCHEDULER_TICKS.inc(result="run")
+        finally:
+            self._lock.release()
+
+    def _following(self, tick: float, now: float) -> float:
+        """Next tick to run after ``tick`` once the run ended at ``now``."""
+        nxt = self.next_tick(tick)
+        if now <= nxt:
+            return nxt
+        latest = math.floor(now / self.period) * self.period
+        missed = int(round((latest - nxt) / self.period)) + 1
+        if now - latest <= self.max_late:
+            skipped, nxt = missed - 1, latest
+        else:
+            skipped, nxt = missed, latest + self.period
+        if skipped:
+            print(f"Scheduler: {skipped} tick dilewati karena siklus sebelumnya melewati jadwal")
+            SCHEDULER_TICKS.inc(skipped, result="skipped")
+        return nxt
+
+    def run_forever(self, job: Callable[[set[str]], None]) -> None:
+        tick = time.time()
+        delay = 0.0
+        while True:
+            try:
+                self._run_tick(job, tick, delay)
+            except Exception as e:
+                print(f"Terjadi error saat menjalankan job: {e}")
+            tick = self._following(tick, time.time())
+            delay = random.uniform(0, self.jitter) if self.jitter else 0.0
+            self._sleep_until(tick + delay)
@@ -2,31 +2,92 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from utils import save_cookies, load_cookies, save_local_storage, load_local_storage
+from sso_token import read_sso_token, sso_token_valid
 import logging
 import time
 import os
 from dotenv import load_dotenv
-import json as _json
-from urllib.request import urlopen
+from totp_provider import TotpProvider
 
 load_dotenv('config/credentials.env')
 
+
+class _StepTimer:
+    """Wall-clock duration of each login step, reported once at the end."""
+
+    def __init__(self):
+        self.steps = []
+        self._last = time.monotonic()
+
+    def mark(self, name):
+        now = time.monotonic()
+        self.steps.append((name, now - self._last))
+        self._last = now
+
+    def report(self, outcome):
+        total = sum(sec for _, sec in self.steps)
+        detail = ", ".join(f"{name}={sec:.2f}s" for name, sec in self.steps)
+        print(f"Login SSO {outcome} dalam {total:.1f}s ({detail})")
+        logging.info("Login SSO %s in %.1fs (%s)", outcome, total, detail)
+
+
 def login_sso(driver, config):
+    timer = _StepTimer()
+    try:
+        ok = _login_sso(driver, config, timer)
+    except Exception:
+        timer.report("error")
+        raise
+    timer.report("berhasil" if ok else "gagal")
+    return ok
+
+
+def _login_sso(driver, config, timer):
     driver.get(config['sso_url'])
     wait = WebDriverWait(driver, config['timeout'])
+    timer.mark("buka_sso")
     
     # Coba load cookies & localStorage untuk skip login
     load_cookies(driver, 'data/sso_cookies.json')
     load_local_storage(driver, 'data/sso_localstorage.json')
     driver.get(config['sso_url'])  # Refresh untuk apply cookies & storage
+    timer.mark("muat_sesi")
     
-    # Cek apakah sudah login (berdasarkan redirect URL)
+    # Cek apakah sudah login (berdasarkan redirect URL), atau form login tampil
     try:
-        if wait.until(EC.url_contains(config['redirect_url'])):
+        wait.until(EC.any_of(
+            EC.url_contains(config['redirect_url']),
+            EC.presence_of_element_located((By.CSS_SELECTOR, config['username_field'])),
+        ))
+        if config['redirect_url'] in (driver.current_url or ''):
             logging.info("Already logged in via cookies.")
-            return True
+            # Tunggu portal menerbitkan sso_token baru, lalu simpan ulang sesi
+            stale_token = read_sso_token('data/sso_localstorage.json')
+            try:
+                wait.until(lambda d: d.execute_script("return window.localStorage.getItem('sso_token');") not in (None, '', stale_token))
+                renewed = True
+            except Exception:
+                renewed = False
+            if renewed:
+                save_cookies(driver, 'data/sso_cookies.json')
+                save_local_storage(driver, 'data/sso_localstorage.json')
+            if renewed and sso_token_valid('data/sso_localstorage.json'):
+                timer.mark("sesi_cookies")
+                return True
+            # Sesi cookies tidak menghasilkan token baru yang valid: buang sesi
+            # lalu login ulang lewat form, jangan laporkan sukses
+            logging.warning("sso_token tidak diperbarui setelah login via cookies; login ulang lewat form")
+            driver.execute_script("window.localStorage.clear();")
+            try:
+                # Semua domain, termasuk cookie sesi Keycloak (Chrome)
+                driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+            except Exception:
+                driver.delete_all_cookies()
+            driver.get(config['sso_url'])
+            timer.mark("sesi_cookies")
     except:
         pass
+    timer.mark("cek_sesi")
     
     # Isi form login
     try:
@@ -49,6 +110,7 @@ def login_sso(driver, config):
         except Exception:
             # Jika tidak ada salah satunya dalam timeout, anggap gagal
             raise
+        timer.mark("kredensial")
 
         # Jika halaman meminta OTP
         if driver.current_url and 'login-actions/authenticate' in driver.current_url:
@@ -62,11 +124,11 @@ def login_sso(driver, config):
             totp_account = None
             # Allow override via env var; fallback to config, then sensible default for Docker
             totp_url = os.getenv('TOTP_URL') or config.get('totp_url', 'http://host.docker.internal:8001/totp')
+            # Kode diambil sekali di awal lalu dipakai ulang selama masih berlaku
+            totp = TotpProvider(totp_url)
             try:
-                with urlopen(totp_url, timeout=5) as resp:
-                    data = resp.read().decode('utf-8')
-                    totp_payload = _json.loads(data)
-                    totp_account = str("wasis kurniawan").strip()
+                totp.code()
+                totp_account = str("wasis kurniawan").strip()
             except Exception as ex:
                 logging.error("Failed fetching TOTP for account info: %s", str(ex))
 
@@ -77,41 +139,51 @@ def login_sso(driver, config):
                     for t in titles:
                         try:
                             if t.text and t.text.strip() == totp_account:
+                                # Tile adalah label dari radio input (halaman tidak dimuat
+                                # ulang): tunggu radio terkait terpilih, bukan staleness
+                                labels = t.find_elements(By.XPATH, './ancestor::label[1]')
+                                radio_id = labels[0].get_attribute('for') if labels else None
                                 t.click()
-                                time.sleep(2)  # Tambah delay agar halaman sempat termuat
+                                if radio_id:
+                                    wait.until(lambda d: d.find_element(By.ID, radio_id).is_selected())
                                 break
                         except Exception:
                             continue
             except Exception:
                 pass
+            timer.mark("pilih_device")
 
             # Retry submit OTP jika gagal redirect
             for attempt in range(3):
+                submitted = False
                 try:
-                    # Ambil TOTP dari service lokal (fresh setiap attempt)
-                    with urlopen(totp_url, timeout=5) as resp:
-                        data = resp.read().decode('utf-8')
-                        totp_payload = _json.loads(data)
-                        totp_value = totp_payload.get('totp')
-                    if not totp_value:
-                        raise RuntimeError('No TOTP value received from provider')
+                    # Kode yang masih cukup lama berlaku; jika hampir habis, tunggu step berikutnya
+                    totp_value = totp.code()
 
+                    otp_input = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '#otp')))
                     otp_input.clear()
                     logging.info(f"Filling OTP input with value (attempt {attempt+1}): {str(totp_value)}")
                     otp_input.send_keys(str(totp_value))
-                    time.sleep(2)  # Tambah delay sebelum submit OTP
+                    # Pastikan nilai OTP sudah masuk sebelum submit
+                    wait.until(lambda d: otp_input.get_attribute('value') == str(totp_value))
 
                     submit_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '#kc-login')))
                     submit_btn.click()
+                    submitted = True
 
                     # Tunggu redirect setelah OTP
                     wait.until(EC.url_contains(config['redirect_url']))
                     break  # Berhasil, keluar dari loop
                 except Exception as e:
                     logging.warning(f"OTP submit failed (attempt {attempt+1}): {str(e)}")
+                    # Hanya kode yang benar-benar dikirim lalu ditolak yang dibuang;
+                    # gagal sebelum submit (elemen belum siap) memakai kode yang sama
+                    if submitted:
+                        totp.discard()
                     if attempt == 2:
                         raise  # Sudah 3x gagal, raise error
-                    time.sleep(1)  # Tunggu sebentar sebelum retry
+            print(f"TOTP: {totp.fetches} kali ambil kode, {attempt + 1} kali submit OTP")
+            timer.mark("otp")
         else:
             # Tidak perlu OTP; sudah redirect
             pass
@@ -121,6 +193,7 @@ def login_sso(driver, config):
         # Simpan cookies & localStorage untuk sesi berikutnya
         save_cookies(driver, 'data/sso_cookies.json')
         save_local_storage(driver, 'data/sso_localstorage.json')
+        timer.mark("simpan_sesi")
         return True
     except Exception as e:
         logging.error("Login failed: %s", str(e))
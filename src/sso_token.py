@@ -0,0 +1,232 @@
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+from urllib.error import HTTPError, URLError
+from urllib.request import Request
+
+from env import env_float, env_int
+
+
+DEFAULT_LOCALSTORAGE_PATH = "data/sso_localstorage.json"
+
+# Cheap authenticated call used by the optional probe (one monitoring row)
+PROBE_URL = (
+    "https://api-siasn.bkn.go.id/siasn-instansi/pengadaan/usulan/monitoring"
+    "?no_peserta=&nama=&tgl_usulan=&jenis_pengadaan_id=02&jenis_formasi_id=&status_usulan=&periode=2024&limit=1&offset=0"
+)
+
+
+def read_sso_token(path: str = DEFAULT_LOCALSTORAGE_PATH) -> str | None:
+    """``sso_token`` from the saved localStorage JSON, or ``None`` if absent."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    token = data.get("sso_token") if isinstance(data, dict) else None
+    return token or None
+
+
+def jwt_claims(token: str) -> dict | None:
+    """Payload of a JWT, without verifying the signature."""
+    parts = token.split(".")
+    if len(parts) < 2:
+        return None
+    payload = parts[1] + "=" * (-len(parts[1]) % 4)
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+    except ValueError:
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def jwt_expiry(token: str) -> float | None:
+    """``exp`` claim (epoch seconds) of a JWT, without verifying the signature."""
+    claims = jwt_claims(token)
+    try:
+        return float(claims["exp"]) if claims else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def token_seconds_left(token: str) -> float | None:
+    exp = jwt_expiry(token)
+    return None if exp is None else exp - time.time()
+
+
+def _probe(token: str) -> bool:
+    from http_session import siasn_session
+
+    req = Request(
+        PROBE_URL,
+        headers={
+            "Accept": "application/json, text/plain, */*",
+            "Authorization": f"Bearer {token}",
+            "Origin": "https://siasn-instansi.bkn.go.id",
+            "Referer": "https://siasn-instansi.bkn.go.id/",
+        },
+        method="GET",
+    )
+    try:
+        with siasn_session.urlopen(req, timeout=30) as resp:
+            resp.read()
+        return True
+    except HTTPError as e:
+        # Only an auth failure says the token is bad; other errors are not its fault
+        return e.code not in (401, 403)
+    except URLError:
+        return True
+
+
+def sso_token_valid(
+    path: str = DEFAULT_LOCALSTORAGE_PATH,
+    min_ttl: float | None = None,
+    probe: bool | None = None,
+) -> bool:
+    """True when the saved ``sso_token`` is usable for at least ``min_ttl`` seconds.
+
+    ``min_ttl`` defaults to env ``SSO_TOKEN_MIN_TTL_SECONDS`` (300) so the
+    token does not expire in the middle of a cycle. With ``probe`` (env
+    ``SSO_TOKEN_PROBE=1``) a one-row monitoring request also has to pass.
+    """
+    token = read_sso_token(path)
+    if not token:
+        return False
+    left = token_seconds_left(token)
+    if min_ttl is None:
+        min_ttl = env_float("SSO_TOKEN_MIN_TTL_SECONDS", 300.0)
+    if left is None:
+        print("Token SSO tidak memiliki klaim exp yang bisa dibaca")
+        return False
+    if left < min_ttl:
+        print(f"Token SSO kedaluwarsa atau hampir kedaluwarsa (sisa {left:.0f}s)")
+        return False
+    if probe is None:
+        probe = os.getenv("SSO_TOKEN_PROBE", "0").strip().lower() in ("1", "true", "yes")
+    if probe and not _probe(token):
+        print("Token SSO ditolak oleh API (401/403)")
+        return False
+    print(f"Token SSO masih berlaku (sisa {left / 60:.0f} menit)")
+    return True
+
+
+# Peak RSS (MB) of each login subprocess since the last take_login_peaks()
+_login_peaks_mb: list[float] = []
+
+
+def take_login_peaks() -> list[float]:
+    """Peak RSS of the login subprocesses run since the previous call."""
+    peaks = list(_login_peaks_mb)
+    del _login_peaks_mb[:]
+    return peaks
+
+
+def _wait_login(proc: subprocess.Popen, timeout: float) -> int:
+    """``proc.wait(timeout)`` that also records the peak RSS of this child.
+
+    ``os.wait4`` returns the child's own rusage; ``RUSAGE_CHILDREN`` would be
+    the maximum over every child the process ever had.
+    """
+    if not hasattr(os, "wait4"):
+        return proc.wait(timeout=timeout)
+    from memory_stats import rusage_peak_mb
+
+    deadline = time.monotonic() + timeout
+    while True:
+        pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            _login_peaks_mb.append(rusage_peak_mb(usage))
+            return proc.returncode
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        time.sleep(0.2)
+
+
+def run_login_subprocess() -> bool:
+    """Login SSO di proses terpisah (src/login_once.py) yang langsung selesai,
+    sehingga memori Chromium sudah bebas sebelum tahap data dimulai."""
+    timeout = env_int("LOGIN_TIMEOUT_SECONDS", 300)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "login_once.py")
+    # Grup proses sendiri agar Chrome ikut dihentikan jika login macet
+    proc = subprocess.Popen([sys.executable, script], start_new_session=True)
+    try:
+        return _wait_login(proc, timeout) == 0
+    except subprocess.TimeoutExpired:
+        print(f"Login SSO melebihi {timeout}s, proses login dihentikan.")
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        proc.wait()
+        return False
+
+
+class TokenProvider:
+    """``sso_token`` shared by worker threads, renewed single-flight on 401.
+
+    Workers read ``token()`` for each request and call ``refresh(rejected)``
+    when the API answers 401. The first caller runs ``renew`` (default:
+    ``oidc_refresh.renew_sso_token``, i.e. refresh-token exchange, then the
+    login subprocess) while the others wait on the lock; they all get the new
+    token. If renewal fails, later callers get ``None`` without retrying it.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_LOCALSTORAGE_PATH,
+        renew: Callable[[], bool] | None = None,
+    ):
+        if renew is None:
+            from oidc_refresh import renew_sso_token
+
+            def renew() -> bool:
+                return renew_sso_token(path)
+
+        self.path = path
+        self._renew = renew
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._failed = False
+        self.refreshes = 0
+
+    def token(self) -> str:
+        with self._lock:
+            if self._token is None:
+                if not os.path.exists(self.path):
+                    raise FileNotFoundError(f"LocalStorage JSON not found: {self.path}")
+                token = read_sso_token(self.path)
+                if not token:
+                    raise ValueError("Key 'sso_token' not found in localStorage JSON")
+                self._token = token
+            return self._token
+
+    def refresh(self, rejected: str) -> str | None:
+        """New token after ``rejected`` got a 401, or ``None`` if renewal failed."""
+        with self._lock:
+            if self._token and self._token != rejected:
+                return self._token  # another worker already renewed it
+            if self._failed:
+                return None
+            print("Token SSO ditolak (401), memperbarui token...")
+            t0 = time.monotonic()
+            try:
+                ok = self._renew()
+            except Exception as e:
+                print(f"Pembaruan token SSO gagal: {e}")
+                ok = False
+            token = read_sso_token(self.path) if ok else None
+            if not token or token == rejected:
+                self._failed = True
+                print("Pembaruan token SSO gagal; request berikutnya tidak akan mencoba lagi.")
+                return None
+            self._token = token
+            self.refreshes += 1
+            print(f"Token SSO diperbarui dalam {time.monotonic() - t0:.1f}s")
+            return token
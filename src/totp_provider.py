@@ -0,0 +1,82 @@
+import json
+import logging
+import time
+from urllib.request import urlopen
+
+from env import env_float, env_int
+
+
+# Payload keys a TOTP service may use for the seconds the code stays valid
+_REMAINING_KEYS = ("remaining", "remaining_seconds", "expires_in", "valid_for", "ttl")
+
+
+class TotpProvider:
+    """TOTP codes from the local service, aligned to the time step.
+
+    A fetched code is reused while it stays valid for at least
+    ``min_validity`` seconds (env ``TOTP_MIN_VALIDITY_SECONDS``, default 8).
+    When less is left, ``code()`` waits for the next step instead of handing
+    out a code that may expire before the form is submitted. Validity comes
+    from the payload (``remaining``/``expires_in``/...) or, if absent, from
+    the ``period`` grid (env ``TOTP_PERIOD``, default 30).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        period: int | None = None,
+        min_validity: float | None = None,
+        timeout: float = 5,
+    ):
+        self.url = url
+        self.period = env_int("TOTP_PERIOD", 30, minimum=1) if period is None else period
+        self.min_validity = env_float("TOTP_MIN_VALIDITY_SECONDS", 8.0) if min_validity is None else min_validity
+        self.timeout = timeout
+        self.fetches = 0
+        self._code: str | None = None
+        self._expires_at = 0.0
+        self._not_before = 0.0
+
+    def _fetch(self) -> None:
+        with urlopen(self.url, timeout=self.timeout) as resp:
+            payload = json.loads(resp.read().decode("utf-8"))
+        self.fetches += 1
+        code = payload.get("totp") if isinstance(payload, dict) else None
+        if not code:
+            raise RuntimeError("No TOTP value received from provider")
+        now = time.time()
+        remaining = None
+        for key in _REMAINING_KEYS:
+            try:
+                remaining = float(payload[key])
+                break
+            except (KeyError, TypeError, ValueError):
+                continue
+        if remaining is None:
+            remaining = self.period - (now % self.period)
+        self._code = str(code)
+        self._expires_at = now + remaining
+
+    def remaining(self) -> float:
+        return self._expires_at - time.time() if self._code else 0.0
+
+    def code(self) -> str:
+        """A code valid for at least ``min_validity`` seconds."""
+        wait = self._not_before - time.time()
+        if wait > 0:
+            time.sleep(wait)
+        if self._code and self.remaining() >= self.min_validity:
+            return self._code
+        self._fetch()
+        left = self.remaining()
+        if left < self.min_validity:
+            logging.info("TOTP expires in %.1fs, waiting for the next step", left)
+            time.sleep(max(0.0, left) + 0.5)
+            self._fetch()
+        return self._code  # type: ignore[return-value]
+
+    def discard(self) -> None:
+        """Drop the current code (rejected or used); the next one is from a later step."""
+        if self._code:
+            self._not_before = self._expires_at + 0.5
+        self._code = None
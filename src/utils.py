@@ -44,14 +44,18 @@ def load_local_storage(driver, path):
         except Exception:
             items = {}
     if isinstance(items, dict):
-        # Set each key back into localStorage for current origin
-        for k, v in items.items():
-            try:
-                driver.execute_script(
-                    "window.localStorage.setItem(arguments[0], arguments[1]);",
-                    k,
-                    v if v is not None else ""
-                )
-            except Exception:
-                continue
+        # Set all keys back into localStorage for current origin in one call
+        try:
+            driver.execute_script(
+                """
+                var items = arguments[0];
+                for (var k in items) {
+                    window.localStorage.setItem(k, items[k] == null ? "" : items[k]);
+                }
+                """,
+                items,
+            )
+        except Exception:
+            logging.warning("LocalStorage restore failed for %s", path)
+            return
         logging.info("LocalStorage loaded from %s", path)
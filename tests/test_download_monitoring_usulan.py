@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from download_monitoring_usulan import _split_monitoring_page
+
+
+def _data(body: bytes):
+    bounds = _split_monitoring_page(body)
+    assert bounds is not None
+    start, end, total = bounds
+    return json.loads(b"[" + body[start:end] + b"]"), total
+
+
+def test_split_page_with_meta():
+    items = [{"id": "a", "nama": "Dinas [X] {Y}", "usulan_data": {"data": {"no_peserta": "NP1"}}}]
+    body = json.dumps({"data": items, "meta": {"total": 12}}).encode()
+    assert _data(body) == (items, 12)
+
+
+def test_split_page_with_trailing_array_field():
+    body = b'{"data":[{"a":1}],"meta":{"total":5},"errors":[]}'
+    assert _data(body) == ([{"a": 1}], 5)
+
+
+def test_split_page_with_brackets_and_escapes_in_strings():
+    items = [{"a": "]\"[", "b": "\\", "c": ["}", {"d": "x]"}]}, {"e": "ü"}]
+    for ensure_ascii in (True, False):
+        body = json.dumps({"meta": {"total": 2}, "data": items, "x": [[1]]}, ensure_ascii=ensure_ascii).encode()
+        assert _data(body) == (items, 2)
+
+
+def test_split_page_empty_data():
+    assert _data(b'{"data": [ ], "meta": {"total": 0}}') == ([], 0)
+
+
+def test_split_page_other_shapes_fall_back():
+    assert _split_monitoring_page(b'{"message":"Unauthorized"}') is None
+    assert _split_monitoring_page(b'{"meta":{"data":[1]},"data":[2]}') is None
+    assert _split_monitoring_page(b'{"data":[{"a":"x}]') is None
+    assert _split_monitoring_page(b'[{"data":[1]}]') is None